@@ -3,86 +3,245 @@
 # ----------------------------------------------------------------------------#
 
 import json
-import dateutil.parser
-import babel
-from flask import Flask, render_template, request, Response, flash, redirect, url_for
+import os
+import secrets
+from collections import OrderedDict
+from collections.abc import Mapping
+from datetime import datetime
+from functools import lru_cache
+from itertools import groupby
+import click
+from flask import Flask, Blueprint, render_template, request, Response, flash, redirect, url_for, abort, \
+    stream_template, stream_with_context, current_app
 from flask_moment import Moment
 import logging
 from logging import Formatter, FileHandler
 from flask_wtf import FlaskForm
-from flask_migrate import Migrate
-from models import db, Venue, Artist, Show
+from pagination import keyset_paginate
+from cache import ResponseCache, conditional_get
+import bulk
+import metrics
+from routing import ReplicaRouter
+from models import db, Venue, Artist, Show, count_new_show, delete_shows_of, touch_shows_of, \
+    rollover_show_counters, check_show_counters
 
 
 from forms import *
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 # ----------------------------------------------------------------------------#
 # App Config.
 # ----------------------------------------------------------------------------#
 
-app = Flask(__name__)
-moment = Moment(app)
-app.config.from_object('config')
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-db.init_app(app)
-migrate = Migrate(app, db)
+moment = Moment()
+response_cache = ResponseCache()
+replica_router = ReplicaRouter()
+request_timer = metrics.RequestTimer()
+
+# the views, error handlers and commands below; the commands stay top-level (`flask seed-synthetic`)
+bp = Blueprint('fyyur', __name__, cli_group=None)
+
+
+def create_app(config=None):
+    """Build the app from config.py, updated from ``config``: a mapping, or an object or
+    import path for ``app.config.from_object``.
+
+    Importing this module builds nothing and does not import babel.dates, dateutil or Alembic
+    (create_app() imports the last), so a pre-forking server can import it once in its master
+    and share it across workers.
+    """
+    app = Flask(__name__)
+    app.config.from_object('config')
+    if isinstance(config, Mapping):
+        app.config.update(config)
+    elif config is not None:
+        app.config.from_object(config)
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', metrics.engine_options(app.config))
+    if not app.config.get('SECRET_KEY'):
+        app.config['SECRET_KEY'] = _instance_secret_key(app.instance_path)
+
+    moment.init_app(app)
+    db.init_app(app)
+    # Flask-Migrate brings in Alembic, the largest import by far: imported here, it stays
+    # off the import of this module
+    from flask_migrate import Migrate
+    Migrate(app, db)
+    response_cache.init_app(app)
+    replica_router.init_app(app)
+    request_timer.init_app(app)
+
+    app.jinja_env.filters['datetime'] = format_datetime
+    app.register_blueprint(bp)
+
+    if not app.debug and not app.testing:
+        file_handler = FileHandler('error.log')
+        file_handler.setFormatter(
+            Formatter('%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]')
+        )
+        app.logger.setLevel(logging.INFO)
+        file_handler.setLevel(logging.INFO)
+        app.logger.addHandler(file_handler)
+        app.logger.info('errors')
+    return app
+
+
+def _instance_secret_key(instance_path):
+    # without FYYUR_SECRET_KEY, one random key per installation, kept in the instance
+    # folder: every worker and every restart signs sessions and CSRF tokens with it
+    path = os.path.join(instance_path, 'secret_key')
+    if not os.path.exists(path):
+        os.makedirs(instance_path, exist_ok=True)
+        staged = '%s.%d' % (path, os.getpid())
+        with open(os.open(staged, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), 'w') as f:
+            f.write(secrets.token_hex(32))
+        try:
+            os.link(staged, path)  # atomic, and fails if another worker got there first
+        except FileExistsError:
+            pass
+        finally:
+            os.unlink(staged)
+    with open(path) as f:
+        return f.read().strip()
 
 
 # ----------------------------------------------------------------------------#
 # Filters.
 # ----------------------------------------------------------------------------#
 
-def format_datetime(value, format='medium'):
-    date = dateutil.parser.parse(value)
-    if format == 'full':
-        format = "EEEE MMMM, d, y 'at' h:mma"
-    elif format == 'medium':
-        format = "EE MM, dd, y h:mma"
-    return babel.dates.format_datetime(date, format)
+DATETIME_FORMATS = {
+    'full': "EEEE MMMM, d, y 'at' h:mma",
+    'medium': "EE MM, dd, y h:mma",
+}
+
 
+@lru_cache(maxsize=None)
+def _datetime_pattern(format, locale):
+    # Babel and its locale data load with the first show time rendered, not at startup
+    import babel.dates
 
-app.jinja_env.filters['datetime'] = format_datetime
+    return babel.dates.parse_pattern(DATETIME_FORMATS.get(format, format)), \
+        babel.Locale.parse(locale or babel.dates.LC_TIME)
+
+
+def format_datetime(value, format='medium', locale=None):
+    # views pass datetime objects straight through; strings are still parsed for callers
+    # that have nothing better
+    if not isinstance(value, datetime):
+        import dateutil.parser
+        value = dateutil.parser.parse(value)
+    pattern, locale = _datetime_pattern(format, locale)
+    return pattern.apply(value, locale)
 
 
 # ----------------------------------------------------------------------------#
 # Controllers.
 # ----------------------------------------------------------------------------#
 
-@app.route('/')
+@bp.route('/')
 def index():
-    return render_template('pages/home.html', data=Artist.query.all())
+    return render_template('pages/home.html')
+
+
+def _filter_listing(model, query):
+    # ?genre=Jazz&genre=Blues keeps rows whose genres contain all of them (the @> operator,
+    # served by the GIN index on genres); ?city= and ?state= narrow by location
+    genres = request.args.getlist('genre')
+    if genres:
+        query = query.filter(model.genres.contains(genres))
+    for column in ('city', 'state'):
+        if request.args.get(column):
+            query = query.filter(getattr(model, column) == request.args[column])
+    return query
+
+
+def _venue_shows(venue_id):
+    return db.session.query(Show.artist_id, Artist.name.label('artist_name'),
+                            Artist.image_link.label('artist_image_link'), Show.start_time) \
+        .join(Artist, Artist.id == Show.artist_id) \
+        .filter(Show.venue_id == venue_id) \
+        .order_by(Show.start_time)
+
+
+def _artist_shows(artist_id):
+    return db.session.query(Show.venue_id, Venue.name.label('venue_name'),
+                            Venue.image_link.label('venue_image_link'), Show.start_time) \
+        .join(Venue, Venue.id == Show.venue_id) \
+        .filter(Show.artist_id == artist_id) \
+        .order_by(Show.start_time)
+
+
+def _split_shows(shows):
+    # one ordered pass over the shows, split at the same boundary as Show.upcoming()/Show.past()
+    now = datetime.now()
+    upcoming_shows = []
+    past_shows = []
+    for show in shows:
+        (upcoming_shows if show.start_time > now else past_shows).append(show._asdict())
+    return upcoming_shows, past_shows
+
+
+def _venue_updated_at(venue_id):
+    return db.session.query(Venue.updated_at).filter(Venue.id == venue_id).scalar()
+
+
+def _artist_updated_at(artist_id):
+    return db.session.query(Artist.updated_at).filter(Artist.id == artist_id).scalar()
 
 
 #  Venues
 #  ----------------------------------------------------------------
 
-@app.route('/venues')
+@bp.route('/venues')
+@replica_router.reads
+@response_cache.cached('venues')
 def venues():
     #  replace with real venues data. num_shows should be aggregated based on number of upcoming shows per venue.  √
-    data = []
+    # one page of venues with their maintained upcoming show counters comes back from a
+    # single keyset-paginated query, so the page costs one statement however deep it is.
+    return _render_venues(keyset_paginate(_venues_query(), VENUE_KEYS, current_app.config['PAGE_SIZE']))
+
+
+# the listing queries, sort keys and page renderers below are shared with the async views in asgi.py
+VENUE_KEYS = [(Venue.state, 'state'), (Venue.city, 'city'), (Venue.name, 'name'), (Venue.id, 'id')]
 
-    locations = Venue.query.with_entities(Venue.city, Venue.state).distinct().all()
-    for location in locations:
-        venues = Venue.query.filter_by(city=location[0], state=location[1]).all()
-        shows = venues[0].upcoming_shows
 
+def _venues_query():
+    return _filter_listing(Venue, Venue.query.with_entities(Venue.id, Venue.name, Venue.city, Venue.state,
+                                                            Venue.upcoming_show_count.label('num_upcoming_shows')))
+
+
+def _render_venues(page):
+    data = []
+    for (city, state), area_venues in groupby(page.items, key=lambda venue: (venue.city, venue.state)):
         data.append({
-            "city": location[0],
-            "state": location[1],
-            "venues": venues + shows
+            "city": city,
+            "state": state,
+            "venues": [{
+                "id": venue.id,
+                "name": venue.name,
+                "num_upcoming_shows": venue.num_upcoming_shows
+            } for venue in area_venues]
         })
 
-    return render_template('pages/venues.html', areas=data);
+    return render_template('pages/venues.html', areas=data, page=page)
 
 
-@app.route('/venues/search', methods=['POST'])
+@bp.route('/venues/search', methods=['POST'])
+@replica_router.reads
 def search_venues():
     #  implement search on artists with partial string search. Ensure it is case-insensitive.  √
     # seach for Hop should return "The Musical Hop".
     # search for "Music" should return "The Musical Hop" and "Park Square Live Music & Coffee"
 
-    search = '%' + request.form.get('search_term') + '%'
-    venues = Venue.query.order_by(Venue.name).filter(Venue.name.ilike(search)).all()
+    # matches and their upcoming show counts come back from one aggregate query
+    venues = Venue.with_num_upcoming_shows(
+        Venue.search_by_name(request.form.get('search_term'), ranked=current_app.config['SEARCH_MODE'] == 'trigram',
+                             limit=current_app.config['SEARCH_LIMIT']))
     data = []
 
     for venue in venues:
@@ -101,55 +260,43 @@ def search_venues():
                            search_term=request.form.get('search_term', ''))
 
 
-@app.route('/venues/<int:venue_id>')
+@bp.route('/venues/<int:venue_id>')
+@replica_router.reads
+@conditional_get(_venue_updated_at)
+@response_cache.cached('venue:{venue_id}')
 def show_venue(venue_id):
-    try:
-        data = []
-        #  replace with real venue data from the venues table, using venue_id   √
-
-        venue = Venue.query.get(venue_id)
-        if venue:
-            data = {
-                "id": venue.id,
-                "name": venue.name,
-                "genres": venue.genres,
-                "address": venue.address,
-                "city": venue.city,
-                "state": venue.state,
-                "phone": venue.phone,
-                "website": venue.website,
-                "facebook_link": venue.facebook_link,
-                "seeking_talent": True if venue.seeking_talent in (True, 't', 'True') else False,
-                "seeking_description": venue.seeking_description,
-                "image_link": venue.image_link if venue.image_link else "",
-                "past_shows_count": venue.num_past_shows,
-                "upcoming_shows_count": venue.num_upcoming_shows,
-            }
-
-        upcoming_shows = []
-        for show in venue.upcoming_shows:
-            artist = Artist.query.get(show.artist_id)
-            upcoming_shows.append({
-                "artist_id": show.artist_id,
-                "artist_name": artist.name,
-                "artist_image_link": artist.image_link,
-                "start_time": str(show.start_time)
-            })
-        past_shows = []
-        for show in venue.past_shows:
-            artist = Artist.query.get(show.artist_id)
-            past_shows.append({
-                "artist_id": show.artist_id,
-                "artist_name": artist.name,
-                "artist_image_link": artist.image_link,
-                "start_time": str(show.start_time)
-            })
-
-        data["upcoming_shows"] = upcoming_shows
-        data["past_shows"] = past_shows
-
-    except Exception as e:
-        return e
+    #  replace with real venue data from the venues table, using venue_id   √
+    # the venue row and its shows joined to the artist columns the template needs are
+    # fetched in two statements, whatever the number of shows. The shows come back as one
+    # ordered scan of the (venue_id, start_time) index and are split at the same boundary
+    # as Show.upcoming()/Show.past().
+    venue = Venue.query.get(venue_id)
+    if not venue:
+        abort(404)
+
+    upcoming_shows, past_shows = _split_shows(_venue_shows(venue.id))
+    return _render_venue(venue, upcoming_shows, past_shows)
+
+
+def _render_venue(venue, upcoming_shows, past_shows):
+    data = {
+        "id": venue.id,
+        "name": venue.name,
+        "genres": venue.genres,
+        "address": venue.address,
+        "city": venue.city,
+        "state": venue.state,
+        "phone": venue.phone,
+        "website": venue.website,
+        "facebook_link": venue.facebook_link,
+        "seeking_talent": True if venue.seeking_talent in (True, 't', 'True') else False,
+        "seeking_description": venue.seeking_description,
+        "image_link": venue.image_link if venue.image_link else "",
+        "past_shows": past_shows,
+        "upcoming_shows": upcoming_shows,
+        "past_shows_count": len(past_shows),
+        "upcoming_shows_count": len(upcoming_shows),
+    }
 
     return render_template('pages/show_venue.html', venue=data)
 
@@ -157,13 +304,13 @@ def show_venue(venue_id):
 #  Create Venue
 #  ----------------------------------------------------------------
 
-@app.route('/venues/create', methods=['GET'])
+@bp.route('/venues/create', methods=['GET'])
 def create_venue_form():
     form = VenueForm()
     return render_template('forms/new_venue.html', form=form)
 
 
-@app.route('/venues/create', methods=['POST'])
+@bp.route('/venues/create', methods=['POST'])
 def create_venue_submission():
     #  insert form data as a new Venue record in the db, instead   √
     #  modify data to be the data object returned from db insertion   √
@@ -186,6 +333,7 @@ def create_venue_submission():
         db.session.add(venue)
 
         db.session.commit()
+        response_cache.invalidate('venues')
         flash('Venue ' + request.form['name'] + ' was successfully listed!')
 
     except Exception as e:
@@ -199,14 +347,18 @@ def create_venue_submission():
     return render_template('pages/home.html')
 
 
-@app.route('/venues/<venue_id>', methods=['DELETE'])
+@bp.route('/venues/<venue_id>', methods=['DELETE'])
 def delete_venue(venue_id):
     #  Complete this endpoint for taking a venue_id, and using  √
 
     venue = Venue.query.get(venue_id)
     try:
+        # deleting the venue's shows changes its artists' show counters, listed by /api/artists
+        tags = _venue_cache_tags(venue.id) + ['artists']
+        delete_shows_of(venue)
         db.session.delete(venue)
         db.session.commit()
+        response_cache.invalidate(*tags)
         flash('Venue ' + venue.name + ' was successfully deleted!')
 
     except Exception:
@@ -215,33 +367,47 @@ def delete_venue(venue_id):
 
     finally:
         db.session.close()
-    # returns the name of
-    return None
+    # the page's script navigates home itself once the request is done, where the flash shows
+    return '', 204
 
 
 #  Artists
 #  ----------------------------------------------------------------
-@app.route('/artists')
+@bp.route('/artists')
+@replica_router.reads
+@response_cache.cached('artists')
 def artists():
     #  replace with real data returned from querying the database    √
-    artists = Artist.query.with_entities(Artist.id, Artist.name).all()
+    return _render_artists(keyset_paginate(_artists_query(), ARTIST_KEYS, current_app.config['PAGE_SIZE']))
+
+
+ARTIST_KEYS = [(Artist.name, 'name'), (Artist.id, 'id')]
+
 
+def _artists_query():
+    return _filter_listing(Artist, Artist.query.with_entities(Artist.id, Artist.name))
+
+
+def _render_artists(page):
     data = []
-    for artist in artists:
+    for artist in page.items:
         data.append({
             "id": artist.id,
             "name": artist.name
         })
-    return render_template('pages/artists.html', artists=data)
+    return render_template('pages/artists.html', artists=data, page=page)
 
 
-@app.route('/artists/search', methods=['POST'])
+@bp.route('/artists/search', methods=['POST'])
+@replica_router.reads
 def search_artists():
     #  implement search on artists with partial string search. Ensure it is case-insensitive.   √
     # seach for "A" should return "Guns N Petals", "Matt Quevado", and "The Wild Sax Band".
     # search for "band" should return "The Wild Sax Band".
-    search = '%' + request.form.get('search_term') + '%'
-    artists = Artist.query.order_by(Artist.name).filter(Artist.name.ilike(search)).all()
+    # matches and their upcoming show counts come back from one aggregate query
+    artists = Artist.with_num_upcoming_shows(
+        Artist.search_by_name(request.form.get('search_term'), ranked=current_app.config['SEARCH_MODE'] == 'trigram',
+                              limit=current_app.config['SEARCH_LIMIT']))
     data = []
 
     for artist in artists:
@@ -260,63 +426,49 @@ def search_artists():
                            search_term=request.form.get('search_term', ''))
 
 
-@app.route('/artists/<int:artist_id>')
+@bp.route('/artists/<int:artist_id>')
+@replica_router.reads
+@conditional_get(_artist_updated_at)
+@response_cache.cached('artist:{artist_id}')
 def show_artist(artist_id):
     # shows the venue page with the given venue_id
     #  replace with real venue data from the venues table, using venue_id    √
-    try:
-        data = []
-        artist = Artist.query.get(artist_id)
-
-        if artist:
-            data = {
-                "id": artist.id,
-                "name": artist.name,
-                "genres": artist.genres,
-                "city": artist.city,
-                "state": artist.state,
-                "phone": artist.phone,
-                "website": artist.website,
-                "facebook_link": artist.facebook_link,
-                "seeking_venue": True if artist.seeking_venue in (True, 't', 'True') else False,
-                "seeking_description": artist.seeking_description,
-                "image_link": artist.image_link,
-                "past_shows_count": artist.num_past_shows,
-                "upcoming_shows_count": artist.num_upcoming_shows,
-            }
-
-        upcoming_shows = []
-        for show in artist.upcoming_shows:
-            venue = Venue.query.get(show.venue_id)
-            upcoming_shows.append({
-                "venue_id": venue.id,
-                "venue_name": venue.name,
-                "venue_image_link": venue.image_link,
-                "start_time": str(show.start_time)
-            })
-
-        past_shows = []
-        for show in artist.past_shows:
-            venue = Venue.query.get(show.venue_id)
-            past_shows.append({
-                "venue_id": venue.id,
-                "venue_name": venue.name,
-                "venue_image_link": venue.image_link,
-                "start_time": str(show.start_time)
-            })
-
-        data["upcoming_shows"] = upcoming_shows
-        data["past_shows"] = past_shows
-
+    # as with show_venue, the artist row and its shows joined to the venue columns are
+    # fetched in two statements, whatever the length of the artist's history, reading the
+    # (artist_id, start_time) index in order.
+    artist = Artist.query.get(artist_id)
+    if not artist:
+        abort(404)
+
+    upcoming_shows, past_shows = _split_shows(_artist_shows(artist.id))
+    return _render_artist(artist, upcoming_shows, past_shows)
+
+
+def _render_artist(artist, upcoming_shows, past_shows):
+    data = {
+        "id": artist.id,
+        "name": artist.name,
+        "genres": artist.genres,
+        "city": artist.city,
+        "state": artist.state,
+        "phone": artist.phone,
+        "website": artist.website,
+        "facebook_link": artist.facebook_link,
+        "seeking_venue": True if artist.seeking_venue in (True, 't', 'True') else False,
+        "seeking_description": artist.seeking_description,
+        "image_link": artist.image_link,
+        "past_shows": past_shows,
+        "upcoming_shows": upcoming_shows,
+        "past_shows_count": len(past_shows),
+        "upcoming_shows_count": len(upcoming_shows),
+    }
 
-    except Exception as e:
-        return e
     return render_template('pages/show_artist.html', artist=data)
 
 
 #  Update
 #  ----------------------------------------------------------------
-@app.route('/artists/<int:artist_id>/edit', methods=['GET'])
+@bp.route('/artists/<int:artist_id>/edit', methods=['GET'])
 def edit_artist(artist_id):
     try:
         artist = Artist.query.get(artist_id)
@@ -339,7 +491,7 @@ def edit_artist(artist_id):
     return render_template('forms/edit_artist.html', form=form, artist=artist)
 
 
-@app.route('/artists/<int:artist_id>/edit', methods=['POST'])
+@bp.route('/artists/<int:artist_id>/edit', methods=['POST'])
 def edit_artist_submission(artist_id):
     # take values from the form submitted, and update existing   √
 
@@ -355,9 +507,11 @@ def edit_artist_submission(artist_id):
         artist.image_link = request.form.get('image_link')
         artist.seeking_venue = True if request.form.get('seeking_venue') == 'y' else False
         artist.seeking_description = request.form.get('seeking_description')
+        touch_shows_of(artist)
 
         db.session.add(artist)
         db.session.commit()
+        response_cache.invalidate(*_artist_cache_tags(artist_id))
         flash('Artist ' + request.form['name'] + ' was successfully updated!')
 
     except Exception as e:
@@ -367,10 +521,10 @@ def edit_artist_submission(artist_id):
     finally:
         db.session.close()
 
-    return redirect(url_for('show_artist', artist_id=artist_id))
+    return redirect(url_for('.show_artist', artist_id=artist_id))
 
 
-@app.route('/venues/<int:venue_id>/edit', methods=['GET'])
+@bp.route('/venues/<int:venue_id>/edit', methods=['GET'])
 def edit_venue(venue_id):
     venue = Venue.query.get(venue_id)
 
@@ -392,7 +546,7 @@ def edit_venue(venue_id):
     return render_template('forms/edit_venue.html', form=form, venue=venue)
 
 
-@app.route('/venues/<int:venue_id>/edit', methods=['POST'])
+@bp.route('/venues/<int:venue_id>/edit', methods=['POST'])
 def edit_venue_submission(venue_id):
     #  take values from the form submitted, and update existing  √
     venue = Venue.query.get(venue_id)
@@ -408,9 +562,11 @@ def edit_venue_submission(venue_id):
         venue.image_link = request.form.get('image_link')
         venue.seeking_talent = True if request.form.get('seeking_talent') == 'y' else False
         venue.seeking_description = request.form.get('seeking_description')
+        touch_shows_of(venue)
 
         db.session.add(venue)
         db.session.commit()
+        response_cache.invalidate(*_venue_cache_tags(venue_id))
         flash('Venue ' + request.form['name'] + ' was successfully updated!')
 
     except Exception as e:
@@ -420,19 +576,19 @@ def edit_venue_submission(venue_id):
     finally:
         db.session.close()
 
-    return redirect(url_for('show_venue', venue_id=venue_id))
+    return redirect(url_for('.show_venue', venue_id=venue_id))
 
 
 #  Create Artist
 #  ----------------------------------------------------------------
 
-@app.route('/artists/create', methods=['GET'])
+@bp.route('/artists/create', methods=['GET'])
 def create_artist_form():
     form = ArtistForm()
     return render_template('forms/new_artist.html', form=form)
 
 
-@app.route('/artists/create', methods=['POST'])
+@bp.route('/artists/create', methods=['POST'])
 def create_artist_submission():
     # called upon submitting the new artist listing form
     #  insert form data as a new Venue record in the db, instead     √
@@ -455,6 +611,7 @@ def create_artist_submission():
         db.session.add(artist)
 
         db.session.commit()
+        response_cache.invalidate('artists')
         flash('Venue ' + request.form['name'] + ' was successfully listed!')
 
     except Exception as e:
@@ -471,48 +628,73 @@ def create_artist_submission():
 #  Shows
 #  ----------------------------------------------------------------
 
-@app.route('/shows')
+@bp.route('/shows')
+@replica_router.reads
+@response_cache.cached('shows')
 def shows():
     # displays list of shows at /shows
     #  replace with real venues data. num_shows should be aggregated based on number of upcoming shows per venue.     √
-    data = []
+    shows = _shows_query()
 
-    shows = Show.query.join(Venue, (Venue.id == Show.venue_id)).join(Artist, (Artist.id == Show.artist_id)) \
-        .with_entities(Show.venue_id, Venue.name.label('venue_name'), Show.artist_id, Artist.name.label('artist_name'),
-                       Artist.image_link, Show.start_time)
-    for show in shows:
-        data.append({
-            "venue_id": show.venue_id,
-            "venue_name": show.venue_name,
-            "artist_id": show.artist_id,
-            "artist_name": show.artist_name,
-            "artist_image_link": show.image_link,
-            "start_time": str(show.start_time)
-        })
-    return render_template('pages/shows.html', shows=data)
+    if current_app.config['STREAM_SHOWS']:
+        # the whole listing, read through a server-side cursor and rendered as it arrives,
+        # so neither the rows nor the HTML are ever held in memory all at once
+        rows = shows.order_by(Show.start_time, Show.id).yield_per(current_app.config['STREAM_BATCH_SIZE'])
+        return Response(stream_template('pages/shows.html', shows=(_show_tile(show) for show in rows), page=None))
+
+    return _render_shows(keyset_paginate(shows, SHOW_KEYS, current_app.config['PAGE_SIZE']))
 
 
-@app.route('/shows/create')
+SHOW_KEYS = [(Show.start_time, 'start_time'), (Show.id, 'id')]
+
+
+def _shows_query():
+    return Show.query.join(Venue, (Venue.id == Show.venue_id)).join(Artist, (Artist.id == Show.artist_id)) \
+        .with_entities(Show.id, Show.venue_id, Venue.name.label('venue_name'), Show.artist_id,
+                       Artist.name.label('artist_name'), Artist.image_link, Show.start_time)
+
+
+def _render_shows(page):
+    return render_template('pages/shows.html', shows=[_show_tile(show) for show in page.items], page=page)
+
+
+def _show_tile(show):
+    return {
+        "venue_id": show.venue_id,
+        "venue_name": show.venue_name,
+        "artist_id": show.artist_id,
+        "artist_name": show.artist_name,
+        "artist_image_link": show.image_link,
+        "start_time": show.start_time
+    }
+
+
+@bp.route('/shows/create')
 def create_shows():
     # renders form. do not touch.
     form = ShowForm()
     return render_template('forms/new_show.html', form=form)
 
 
-@app.route('/shows/create', methods=['POST'])
+@bp.route('/shows/create', methods=['POST'])
 def create_show_submission():
     # called to create new shows in the db, upon submitting new show listing form
     # insert form data as a new Show record in the db, instead   √
+    import dateutil.parser
 
     try:
         show = Show(
             venue_id=request.form.get('venue_id'),
             artist_id=request.form.get('artist_id'),
-            start_time=request.form.get('start_time')
+            start_time=dateutil.parser.parse(request.form.get('start_time'))
         )
         db.session.add(show)
+        count_new_show(show)
+        # the venue's and the artist's show counters appear in both listings
+        tags = ['shows', 'venues', 'artists', 'venue:%s' % show.venue_id, 'artist:%s' % show.artist_id]
 
         db.session.commit()
+        response_cache.invalidate(*tags)
         flash('Show was successfully listed!')
 
     except Exception as e:
@@ -526,45 +708,312 @@ def create_show_submission():
     return render_template('pages/home.html')
 
 
-@app.errorhandler(404)
+#  JSON API
+#  ----------------------------------------------------------------
+#  Read-only JSON versions of the listing and detail pages, sharing their queries,
+#  filters, pagination and cache tags.  ?fields=a,b selects only those columns.
+
+def _api_fields(model, names, **columns):
+    fields = OrderedDict((name, getattr(model, name)) for name in names)
+    fields.update(columns)
+    return fields
+
+
+VENUE_FIELDS = _api_fields(Venue, ['id', 'name', 'genres', 'address', 'city', 'state', 'phone', 'website',
+                                  'facebook_link', 'image_link', 'seeking_talent', 'seeking_description'],
+                           num_upcoming_shows=Venue.upcoming_show_count, num_past_shows=Venue.past_show_count)
+ARTIST_FIELDS = _api_fields(Artist, ['id', 'name', 'genres', 'city', 'state', 'phone', 'website', 'facebook_link',
+                                    'image_link', 'seeking_venue', 'seeking_description'],
+                            num_upcoming_shows=Artist.upcoming_show_count, num_past_shows=Artist.past_show_count)
+SHOW_FIELDS = _api_fields(Show, ['id', 'start_time', 'venue_id', 'artist_id'],
+                          venue_name=Venue.name, venue_image_link=Venue.image_link,
+                          artist_name=Artist.name, artist_image_link=Artist.image_link)
+SHOW_LISTS = ('upcoming_shows', 'past_shows')
+
+
+def _api_requested(available):
+    if not request.args.get('fields'):
+        return list(available)
+    # blanks and repeats dropped, so equivalent selections share a body and an ETag
+    fields = list(OrderedDict.fromkeys(field for field in request.args['fields'].split(',') if field))
+    unknown = set(fields) - set(available)
+    if unknown:
+        abort(400, 'Unknown fields: %s' % ', '.join(sorted(unknown)))
+    return fields
+
+
+def _json(payload, status=200):
+    if orjson is not None:
+        body = orjson.dumps(payload)
+    else:
+        body = json.dumps(payload, default=lambda value: value.isoformat())
+    return Response(body, status=status, mimetype='application/json')
+
+
+def _api_list(query, fields, columns, keys):
+    # the sort keys are always selected so the page can be cut, but only requested fields
+    # are returned
+    entities = [columns[field].label(field) for field in fields]
+    entities += [column.label(name) for column, name in keys if name not in fields]
+    page = keyset_paginate(query.with_entities(*entities), keys, current_app.config['PAGE_SIZE'])
+    return _json({
+        "data": [{field: getattr(row, field) for field in fields} for row in page.items],
+        "prev": page.prev_url,
+        "next": page.next_url,
+    })
+
+
+def _join_show_parties(query, fields):
+    # join the venue and artist tables only when one of their columns was asked for
+    for model, key in ((Venue, Show.venue_id), (Artist, Show.artist_id)):
+        if any(SHOW_FIELDS[field].class_ is model for field in fields):
+            query = query.join(model, model.id == key)
+    return query
+
+
+def _api_detail_fields(columns, shows=True):
+    return _api_requested(list(columns) + (list(SHOW_LISTS) if shows else []))
+
+
+def _api_fieldset(columns):
+    # conditional_get() variant of a venue or artist detail route: its ?fields= selection
+    return lambda: ','.join(_api_detail_fields(columns)) if request.args.get('fields') else ''
+
+
+def _api_detail(model, columns, entity_id, load_shows=None, join=None):
+    # ``load_shows`` offers the upcoming_shows/past_shows lists; ``join(query, fields)`` adds
+    # the tables of the requested columns that are not ``model``'s
+    fields = _api_detail_fields(columns, shows=load_shows is not None)
+    scalars = [field for field in fields if field not in SHOW_LISTS]
+    query = db.session.query(*[columns[field].label(field) for field in scalars] or [model.id]).select_from(model)
+    if join is not None:
+        query = join(query, scalars)
+    row = query.filter(model.id == entity_id).first()
+    if row is None:
+        abort(404)
+
+    data = {field: getattr(row, field) for field in scalars}
+    if set(fields) & set(SHOW_LISTS):
+        upcoming_shows, past_shows = _split_shows(load_shows(entity_id))
+        for field, shows in zip(SHOW_LISTS, (upcoming_shows, past_shows)):
+            if field in fields:
+                data[field] = shows
+    return _json(data)
+
+
+@bp.route('/api/venues')
+@replica_router.reads
+@response_cache.cached('venues')
+def api_venues():
+    return _api_list(_filter_listing(Venue, Venue.query), _api_requested(VENUE_FIELDS), VENUE_FIELDS,
+                     [(Venue.state, 'state'), (Venue.city, 'city'), (Venue.name, 'name'), (Venue.id, 'id')])
+
+
+@bp.route('/api/venues/<int:venue_id>')
+@replica_router.reads
+@conditional_get(_venue_updated_at, _api_fieldset(VENUE_FIELDS))
+@response_cache.cached('venue:{venue_id}')
+def api_venue(venue_id):
+    return _api_detail(Venue, VENUE_FIELDS, venue_id, _venue_shows)
+
+
+@bp.route('/api/artists')
+@replica_router.reads
+@response_cache.cached('artists')
+def api_artists():
+    return _api_list(_filter_listing(Artist, Artist.query), _api_requested(ARTIST_FIELDS), ARTIST_FIELDS,
+                     [(Artist.name, 'name'), (Artist.id, 'id')])
+
+
+@bp.route('/api/artists/<int:artist_id>')
+@replica_router.reads
+@conditional_get(_artist_updated_at, _api_fieldset(ARTIST_FIELDS))
+@response_cache.cached('artist:{artist_id}')
+def api_artist(artist_id):
+    return _api_detail(Artist, ARTIST_FIELDS, artist_id, _artist_shows)
+
+
+@bp.route('/api/shows')
+@replica_router.reads
+@response_cache.cached('shows')
+def api_shows():
+    fields = _api_requested(SHOW_FIELDS)
+    return _api_list(_join_show_parties(Show.query, fields), fields, SHOW_FIELDS,
+                     [(Show.start_time, 'start_time'), (Show.id, 'id')])
+
+
+@bp.route('/api/shows/<int:show_id>')
+@replica_router.reads
+@response_cache.cached('shows')
+def api_show(show_id):
+    # no conditional GET: a show has no updated_at of its own, and its page also shows
+    # the venue's and artist's names
+    return _api_detail(Show, SHOW_FIELDS, show_id, join=_join_show_parties)
+
+
+@bp.app_errorhandler(400)
+def bad_request_error(error):
+    if request.path.startswith('/api/'):
+        return _json({"error": error.description}, 400)
+    return error
+
+
+#  Metrics
+#  ----------------------------------------------------------------
+
+@bp.route('/metrics')
+def metrics_endpoint():
+    lines = metrics.pool_wait.render() + metrics.render_pool(db.engine.pool)
+    return Response('\n'.join(lines) + '\n', mimetype='text/plain; version=0.0.4')
+
+
+#  Export
+#  ----------------------------------------------------------------
+
+@bp.route('/export/<any(venues, artists, shows):kind>.<any(csv, ndjson):fmt>')
+def export(kind, fmt):
+    compress = request.args.get('gzip') == '1'
+    filename = '%s.%s%s' % (kind, fmt, '.gz' if compress else '')
+    chunks = bulk.export_catalog(kind, fmt, compress, current_app.config['STREAM_BATCH_SIZE'])
+    return Response(stream_with_context(chunks),
+                    mimetype='application/gzip' if compress else 'text/csv' if fmt == 'csv' else 'application/x-ndjson',
+                    headers={'Content-Disposition': 'attachment; filename=%s' % filename})
+
+
+#  Cache invalidation
+#  ----------------------------------------------------------------
+#  A venue's name and image also appear on the pages of every artist who played there
+#  and on /shows, and the other way round for artists.
+
+def _venue_cache_tags(venue_id):
+    artist_ids = db.session.query(Show.artist_id).filter(Show.venue_id == venue_id).distinct()
+    return ['venues', 'shows', 'venue:%s' % venue_id] + ['artist:%s' % row.artist_id for row in artist_ids]
+
+
+def _artist_cache_tags(artist_id):
+    venue_ids = db.session.query(Show.venue_id).filter(Show.artist_id == artist_id).distinct()
+    return ['artists', 'shows', 'artist:%s' % artist_id] + ['venue:%s' % row.venue_id for row in venue_ids]
+
+
+@bp.app_errorhandler(404)
 def not_found_error(error):
+    if request.path.startswith('/api/'):
+        return _json({"error": "Not found"}, 404)
     return render_template('errors/404.html'), 404
 
 
-@app.errorhandler(500)
+@bp.app_errorhandler(500)
 def server_error(error):
     return render_template('errors/500.html'), 500
 
-@app.errorhandler(403)
+@bp.app_errorhandler(403)
 def server_error(error):
     return render_template('errors/500.html'), 403
 
-@app.errorhandler(405)
+@bp.app_errorhandler(405)
 def server_error(error):
     return render_template('errors/500.html'), 405
 
 
-if not app.debug:
-    file_handler = FileHandler('error.log')
-    file_handler.setFormatter(
-        Formatter('%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]')
-    )
-    app.logger.setLevel(logging.INFO)
-    file_handler.setLevel(logging.INFO)
-    app.logger.addHandler(file_handler)
-    app.logger.info('errors')
+# ----------------------------------------------------------------------------#
+# Commands.
+# ----------------------------------------------------------------------------#
+
+def _invalidate_from_command(*tags):
+    # a command is a process of its own: a 'simple' cache here is not the servers' one,
+    # whose pages go on being served until CACHE_TTL runs out
+    if response_cache.local:
+        click.echo('Warning: CACHE_TYPE=simple keeps each server\'s pages in its own process, out of '
+                   'reach of this command; they may be served stale for up to %ds (CACHE_TTL). '
+                   'Use CACHE_TYPE=redis for invalidations to reach them.' % current_app.config['CACHE_TTL'],
+                   err=True)
+    else:
+        response_cache.invalidate(*tags)
+
+
+@bp.cli.command('rollover-shows')
+def rollover_shows_command():
+    """Move shows that have started from the upcoming to the past counters."""
+    print('%d shows rolled over.' % rollover_show_counters())
+    _invalidate_from_command('venues', 'artists')
+
+
+@bp.cli.command('check-show-counters')
+@click.option('--repair', is_flag=True, help='Rewrite drifted counters from the Show table.')
+def check_show_counters_command(repair):
+    """Report (and optionally repair) venue/artist show counters that drifted."""
+    rolled_over = rollover_show_counters()
+    drifted = check_show_counters(repair=repair)
+    for model, ids in drifted.items():
+        print('%s: %d drifted%s %s' % (model, len(ids), ' (repaired)' if repair and ids else '', ids or ''))
+    if rolled_over or (repair and any(drifted.values())):
+        _invalidate_from_command('venues', 'artists')
+
+
+@bp.cli.command('import-catalog')
+@click.argument('kind', type=click.Choice(['venues', 'artists', 'shows']))
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'jsonl']), help='Defaults to the file extension.')
+@click.option('--batch-size', default=10000, show_default=True, help='Rows per COPY and upsert.')
+def import_catalog_command(kind, path, fmt, batch_size):
+    """Bulk-load venues, artists or shows from CSV or JSON lines, upserting on id."""
+    fmt = fmt or ('jsonl' if path.endswith(('.jsonl', '.ndjson')) else 'csv')
+
+    def on_invalid(line, errors):
+        click.echo('row %d skipped: %s' % (line, errors), err=True)
+
+    stats = bulk.import_catalog(kind, bulk.read_rows(path, fmt), batch_size, on_invalid)
+    _invalidate_from_command('venues', 'artists', 'shows')
+    print('%(read)d rows read, %(invalid)d invalid, %(upserted)d upserted in %(seconds).1fs' % stats +
+          ' (%d rows/s)' % (stats['read'] / stats['seconds'] if stats['seconds'] else 0))
+
+
+@bp.cli.command('export-catalog')
+@click.argument('kind', type=click.Choice(['venues', 'artists', 'shows']))
+@click.argument('output', type=click.File('wb'), default='-')
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'ndjson']), default='csv', show_default=True)
+@click.option('--gzip', 'compress', is_flag=True, help='Gzip the output.')
+def export_catalog_command(kind, output, fmt, compress):
+    """Stream every venue, artist or show to OUTPUT (stdout by default)."""
+    for chunk in bulk.export_catalog(kind, fmt, compress, current_app.config['STREAM_BATCH_SIZE']):
+        output.write(chunk)
+
+
+@bp.cli.command('seed-synthetic')
+@click.option('--venues', default=50000, show_default=True)
+@click.option('--artists', default=200000, show_default=True)
+@click.option('--shows', default=5000000, show_default=True)
+@click.option('--seed', type=int, help='Random seed, for a reproducible dataset.')
+@click.option('--batch-size', default=50000, show_default=True, help='Rows per COPY.')
+def seed_synthetic_command(venues, artists, shows, seed, batch_size):
+    """Append generated venues, artists and shows, for load testing at realistic volumes."""
+    loaded = {}
+
+    def on_progress(kind, rows):
+        loaded[kind] = loaded.get(kind, 0) + rows
+        click.echo('\r%s: %d' % (kind, loaded[kind]), nl=False, err=True)
+
+    stats = bulk.generate_catalog(venues, artists, shows, seed, batch_size, on_progress)
+    click.echo('', err=True)
+    _invalidate_from_command('venues', 'artists', 'shows')
+    for kind in ('venues', 'artists', 'shows'):
+        print('%s: %d rows in %.1fs (%d rows/s)' % (kind, stats[kind]['rows'], stats[kind]['seconds'],
+                                                  stats[kind]['rows'] / stats[kind]['seconds']
+                                                  if stats[kind]['seconds'] else 0))
+    print('analyze %.1fs, counters %.1fs' % (stats['analyze']['seconds'], stats['counters']['seconds']))
+
 
 # ----------------------------------------------------------------------------#
 # Launch.
 # ----------------------------------------------------------------------------#
 
-# Default port:
+# Development server, default port; in production run gunicorn (see gunicorn.conf.py).
 if __name__ == '__main__':
-    app.run()
+    create_app().run()
 
 # Or specify port manually:
 '''
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 5000))
-    app.run(host='0.0.0.0', port=port)
+    create_app().run(host='0.0.0.0', port=port)
 '''
@@ -0,0 +1,210 @@
+"""Async serving mode:
+
+    uvicorn asgi:application --workers 4
+
+The read pages below run as coroutines on an asyncpg engine; the independent statements of
+a page (a venue row, its upcoming shows and its past shows) are in flight at the same time,
+each on its own pooled connection.  They build their statements and render their pages with
+the same helpers and templates as the views in app.py.  Every other request, and any page
+carrying flashed messages, is handed to the sync Flask app unchanged.
+
+The async pages skip the response cache, conditional GET and replica routing of their sync
+counterparts and always read the primary.
+"""
+import asyncio
+from datetime import datetime
+from uuid import uuid4
+
+from asgiref.wsgi import WsgiToAsgi
+from flask import session, abort
+from sqlalchemy import select
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.pool import NullPool
+from werkzeug.exceptions import HTTPException
+from werkzeug.test import EnvironBuilder
+
+from app import create_app, _venue_shows, _artist_shows, _venues_query, _artists_query, _shows_query, \
+    _render_venue, _render_artist, _render_venues, _render_artists, _render_shows, \
+    VENUE_KEYS, ARTIST_KEYS, SHOW_KEYS
+from models import Venue, Artist, Show
+from pagination import keyset_query, keyset_page
+
+
+app = create_app()
+
+
+def _engine(config):
+    url = make_url(config['ASYNC_DATABASE_URL'] or config['SQLALCHEMY_DATABASE_URI'])
+    if not config['ASYNC_DATABASE_URL']:
+        url = url.set(drivername='postgresql+asyncpg')
+    connect_args = {}
+    if url.get_dialect().driver == 'asyncpg':
+        if config['DB_STATEMENT_TIMEOUT'] and not config['DB_PGBOUNCER']:
+            connect_args['server_settings'] = {'statement_timeout': str(config['DB_STATEMENT_TIMEOUT'])}
+        if config['DB_PGBOUNCER']:
+            # neither asyncpg's statement cache nor SQLAlchemy's own: both keep statements
+            # prepared on one server connection, which pgbouncer may not hand back next time,
+            # and the dialect's names repeat across connections, so name each one afresh
+            url = url.update_query_dict({'prepared_statement_cache_size': '0'})
+            connect_args['statement_cache_size'] = 0
+            connect_args['prepared_statement_name_func'] = lambda: '__asyncpg_%s__' % uuid4()
+    if config['DB_PGBOUNCER']:
+        # pgbouncer does the pooling
+        pool_options = {'poolclass': NullPool}
+    else:
+        pool_options = {
+            'pool_size': config['DB_POOL_SIZE'],
+            'max_overflow': config['DB_MAX_OVERFLOW'],
+            'pool_timeout': config['DB_POOL_TIMEOUT'],
+            'pool_recycle': config['DB_POOL_RECYCLE'],
+            'pool_pre_ping': config['DB_POOL_PRE_PING'],
+        }
+    return create_async_engine(url, connect_args=connect_args, **pool_options)
+
+
+engine = _engine(app.config)
+AsyncSession = async_sessionmaker(engine)
+
+
+async def _all(statement):
+    async with AsyncSession() as db_session:
+        return (await db_session.execute(statement)).all()
+
+
+async def _scalar(statement):
+    async with AsyncSession() as db_session:
+        return (await db_session.execute(statement)).scalar()
+
+
+#  Views
+#  ----------------------------------------------------------------
+
+async def venues():
+    per_page = app.config['PAGE_SIZE']
+    rows = await _all(keyset_query(_venues_query(), VENUE_KEYS, per_page).statement)
+    return _render_venues(keyset_page(rows, VENUE_KEYS, per_page))
+
+
+async def show_venue(venue_id):
+    # the venue row, its upcoming shows and its past shows as three concurrent statements,
+    # split at one instant so a show starting meanwhile is in exactly one of them
+    now = datetime.now()
+    shows = _venue_shows(venue_id)
+    venue, upcoming_shows, past_shows = await asyncio.gather(
+        _scalar(select(Venue).where(Venue.id == venue_id)),
+        _all(shows.filter(Show.upcoming(now)).statement),
+        _all(shows.filter(Show.past(now)).statement))
+    if venue is None:
+        abort(404)
+    return _render_venue(venue, [show._asdict() for show in upcoming_shows], [show._asdict() for show in past_shows])
+
+
+async def artists():
+    per_page = app.config['PAGE_SIZE']
+    rows = await _all(keyset_query(_artists_query(), ARTIST_KEYS, per_page).statement)
+    return _render_artists(keyset_page(rows, ARTIST_KEYS, per_page))
+
+
+async def show_artist(artist_id):
+    now = datetime.now()
+    shows = _artist_shows(artist_id)
+    artist, upcoming_shows, past_shows = await asyncio.gather(
+        _scalar(select(Artist).where(Artist.id == artist_id)),
+        _all(shows.filter(Show.upcoming(now)).statement),
+        _all(shows.filter(Show.past(now)).statement))
+    if artist is None:
+        abort(404)
+    return _render_artist(artist, [show._asdict() for show in upcoming_shows], [show._asdict() for show in past_shows])
+
+
+async def shows():
+    per_page = app.config['PAGE_SIZE']
+    rows = await _all(keyset_query(_shows_query(), SHOW_KEYS, per_page).statement)
+    return _render_shows(keyset_page(rows, SHOW_KEYS, per_page))
+
+
+# endpoint of the sync view -> async replacement; the URL rules are app.py's
+VIEWS = {
+    'fyyur.venues': venues,
+    'fyyur.show_venue': show_venue,
+    'fyyur.artists': artists,
+    'fyyur.show_artist': show_artist,
+}
+if not app.config['STREAM_SHOWS']:
+    # the streamed listing already holds one connection for as long as it renders
+    VIEWS['fyyur.shows'] = shows
+
+
+#  ASGI application
+#  ----------------------------------------------------------------
+
+wsgi_application = WsgiToAsgi(app)
+
+
+def _match(scope):
+    if scope['type'] != 'http' or scope['method'] not in ('GET', 'HEAD'):
+        return None, None
+    try:
+        endpoint, kwargs = app.url_map.bind('localhost').match(scope['path'], method='GET')
+    except HTTPException:
+        return None, None
+    return VIEWS.get(endpoint), kwargs
+
+
+def _environ(scope):
+    host, port = scope.get('server') or ('localhost', None)
+    return EnvironBuilder(
+        path=scope['path'],
+        base_url='%s://%s%s%s' % (scope.get('scheme', 'http'), host, ':%d' % port if port else '',
+                                  scope.get('root_path', '')),
+        query_string=scope['query_string'].decode('latin1'),
+        method=scope['method'],
+        headers=[(name.decode('latin1'), value.decode('latin1')) for name, value in scope['headers']],
+    ).get_environ()
+
+
+async def _lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            await engine.dispose()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        return await _lifespan(receive, send)
+
+    view, kwargs = _match(scope)
+    response = None
+    if view is not None:
+        # a request context from the scope, so url_for(), request.endpoint and the session
+        # work in the shared templates exactly as they do under the sync app
+        with app.request_context(_environ(scope)):
+            # showing flashed messages pops them from the session cookie, which only the
+            # sync app writes back
+            if not session.get('_flashes'):
+                # the app's before/after_request hooks run as for a sync view (RequestTimer's
+                # Server-Timing header included)
+                try:
+                    rv = app.preprocess_request()
+                    response = app.make_response(rv if rv is not None else await view(**kwargs))
+                except HTTPException as e:
+                    response = app.make_response(app.handle_http_exception(e))
+                except Exception as e:
+                    # a database error or statement timeout: the app's 500 handler and logging
+                    response = app.make_response(app.handle_exception(e))
+                response = app.process_response(response)
+    if response is None:
+        return await wsgi_application(scope, receive, send)
+
+    await send({
+        'type': 'http.response.start',
+        'status': response.status_code,
+        'headers': [(name.lower().encode('latin1'), value.encode('latin1')) for name, value in response.headers],
+    })
+    await send({'type': 'http.response.body', 'body': b'' if scope['method'] == 'HEAD' else response.get_data()})
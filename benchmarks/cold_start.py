@@ -0,0 +1,47 @@
+"""Time a fresh process takes to import the app, build it and answer its first request.
+
+    python -m benchmarks.cold_start
+    python -m benchmarks.cold_start --path /venues/1 --runs 20
+
+Each run is a new interpreter, so nothing is shared between runs; the medians show what a
+worker pays when it starts without a preloading master.
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+
+RUN = '''
+import json, sys, time
+started = time.perf_counter()
+from app import create_app
+imported = time.perf_counter()
+app = create_app(dict(CACHE_TYPE='null'))
+created = time.perf_counter()
+response = app.test_client().get(sys.argv[1])
+answered = time.perf_counter()
+print(json.dumps({'import': imported - started, 'create_app': created - imported,
+                  'first request': answered - created, 'total': answered - started,
+                  'status': response.status_code}))
+'''
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--path', default='/venues')
+    parser.add_argument('--runs', type=int, default=10)
+    args = parser.parse_args()
+
+    runs = [json.loads(subprocess.check_output([sys.executable, '-c', RUN, args.path]).decode().splitlines()[-1])
+            for _ in range(args.runs)]
+    statuses = {run['status'] for run in runs}
+    print('%d runs of GET %s (status %s)' % (len(runs), args.path, ', '.join(map(str, sorted(statuses)))))
+    for phase in ('import', 'create_app', 'first request', 'total'):
+        times = sorted(run[phase] * 1000 for run in runs)
+        print('%-14s median %7.1f ms   min %7.1f ms   max %7.1f ms' % (
+            phase, statistics.median(times), times[0], times[-1]))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,38 @@
+"""Per-call cost of the ``datetime`` Jinja filter, before and after the fast path.
+
+    python -m benchmarks.datetime_filter
+"""
+import timeit
+from datetime import datetime
+
+import babel.dates
+import dateutil.parser
+
+from app import format_datetime
+
+
+def format_datetime_before(value, format='medium'):
+    # the filter as it was: every view handed it str(start_time)
+    date = dateutil.parser.parse(value)
+    if format == 'full':
+        format = "EEEE MMMM, d, y 'at' h:mma"
+    elif format == 'medium':
+        format = "EE MM, dd, y h:mma"
+    return babel.dates.format_datetime(date, format)
+
+
+def main(number=20000):
+    start_time = datetime(2035, 4, 1, 20, 0, 0)
+    assert format_datetime(start_time, 'full') == format_datetime_before(str(start_time), 'full')
+
+    cases = [
+        ('before: str + parse + format', lambda: format_datetime_before(str(start_time), 'full')),
+        ('after: datetime + cached pattern', lambda: format_datetime(start_time, 'full')),
+    ]
+    for name, call in cases:
+        seconds = min(timeit.repeat(call, number=number, repeat=5))
+        print('%-34s %8.2f us/call' % (name, seconds / number * 1e6))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,223 @@
+"""Latency and throughput of each route against a running server.
+
+    flask seed-synthetic --seed 1
+    FYYUR_CACHE_TYPE=null flask run        # or any other server under test
+    python -m benchmarks.load http://127.0.0.1:5000 --output benchmarks/results/$(git rev-parse --short HEAD).json
+    python -m benchmarks.load --compare benchmarks/results/before.json benchmarks/results/after.json
+
+Every route is driven for --duration seconds by --concurrency threads, each holding one
+keep-alive connection.  Detail pages pick ids at random from a sample of the database
+the app is configured for, so leave the response cache off on the server unless cache
+hits are what is being measured.  p50/p95/p99 latency, requests per second and the mean
+SQL time and statement count from the Server-Timing header are printed per route and
+saved, with the commit and settings of the run, as JSON.
+"""
+import argparse
+import http.client
+import json
+import math
+import os
+import random
+import re
+import subprocess
+import threading
+import time
+from datetime import datetime, timezone
+from urllib.parse import quote, urlencode, urlsplit
+
+from bulk import NAME_WORDS, GENRES
+
+# name -> (method, path); {venue_id}, {artist_id} and {genre} are filled per request, and searches
+# post a random word of the generated names
+ROUTES = [
+    ('index', 'GET', '/'),
+    ('venues', 'GET', '/venues'),
+    ('venues by genre', 'GET', '/venues?genre={genre}'),
+    ('venue', 'GET', '/venues/{venue_id}'),
+    ('venue search', 'POST', '/venues/search'),
+    ('artists', 'GET', '/artists'),
+    ('artist', 'GET', '/artists/{artist_id}'),
+    ('artist search', 'POST', '/artists/search'),
+    ('shows', 'GET', '/shows'),
+    ('api venues', 'GET', '/api/venues'),
+    ('api venue', 'GET', '/api/venues/{venue_id}'),
+    ('api artist', 'GET', '/api/artists/{artist_id}'),
+    ('api shows', 'GET', '/api/shows'),
+]
+
+SERVER_TIMING_DB = re.compile(r'db;dur=([\d.]+);desc="(\d+) queries"')
+
+
+def sample_ids(size=1000):
+    from app import create_app
+    from models import db, Venue, Artist
+
+    with create_app().app_context():
+        return {
+            '%s_id' % model.__tablename__.lower(): [
+                id for id, in db.session.query(model.id).order_by(db.func.random()).limit(size)]
+            for model in (Venue, Artist)
+        }
+
+
+def percentile(ordered, p):
+    return ordered[max(0, int(math.ceil(p / 100.0 * len(ordered))) - 1)]
+
+
+def drive(base_url, method, path, ids, duration, concurrency):
+    url = urlsplit(base_url)
+    deadline = time.perf_counter() + duration
+    latencies, db_times, queries = [], [], []
+    errors = [0]
+    lock = threading.Lock()
+
+    def worker():
+        rng = random.Random()
+        connection = http.client.HTTPConnection(url.hostname, url.port or 80, timeout=30)
+        mine, mine_db, mine_queries, mine_errors = [], [], [], 0
+        while time.perf_counter() < deadline:
+            target = url.path.rstrip('/') + path.format(
+                genre=quote(rng.choice(GENRES)), **{key: rng.choice(values) for key, values in ids.items()})
+            body, headers = None, {}
+            if method == 'POST':
+                body = urlencode({'search_term': rng.choice(NAME_WORDS)})
+                headers['Content-Type'] = 'application/x-www-form-urlencoded'
+            started = time.perf_counter()
+            try:
+                try:
+                    connection.request(method, target, body=body, headers=headers)
+                    response = connection.getresponse()
+                except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                    # the server closed the idle keep-alive connection (e.g. a worker being
+                    # recycled); retried once on a new one, as browsers do
+                    connection.close()
+                    connection.request(method, target, body=body, headers=headers)
+                    response = connection.getresponse()
+                response.read()
+            except (OSError, http.client.HTTPException):
+                mine_errors += 1
+                connection.close()
+                continue
+            mine.append(time.perf_counter() - started)
+            if response.status >= 400:
+                mine_errors += 1
+            timing = SERVER_TIMING_DB.search(response.getheader('Server-Timing') or '')
+            if timing:
+                mine_db.append(float(timing.group(1)))
+                mine_queries.append(int(timing.group(2)))
+        connection.close()
+        with lock:
+            latencies.extend(mine)
+            db_times.extend(mine_db)
+            queries.extend(mine_queries)
+            errors[0] += mine_errors
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    result = {'method': method, 'path': path, 'requests': len(latencies), 'errors': errors[0],
+              'rps': round(len(latencies) / elapsed, 1)}
+    if latencies:
+        result.update({'p%d_ms' % p: round(percentile(latencies, p) * 1000, 2) for p in (50, 95, 99)})
+        result['max_ms'] = round(latencies[-1] * 1000, 2)
+    if db_times:
+        result['db_ms'] = round(sum(db_times) / len(db_times), 2)
+        result['queries'] = max(queries)
+    return result
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_results(results):
+    print('%-18s %8s %7s %9s %9s %9s %8s %7s' % ('route', 'requests', 'rps', 'p50 ms', 'p95 ms', 'p99 ms',
+                                                   'db ms', 'queries'))
+    for name, result in results.items():
+        print('%-18s %8d %7.1f %9s %9s %9s %8s %7s%s' % (
+            name, result['requests'], result['rps'], result.get('p50_ms', '-'), result.get('p95_ms', '-'),
+            result.get('p99_ms', '-'), result.get('db_ms', '-'), result.get('queries', '-'),
+            '  %d errors' % result['errors'] if result['errors'] else ''))
+
+
+def compare(before_path, after_path):
+    with open(before_path) as f:
+        before = json.load(f)
+    with open(after_path) as f:
+        after = json.load(f)
+    print_comparison(before, after, '%s (%s)' % (before_path, (before['commit'] or '?')[:10]),
+                     '%s (%s)' % (after_path, (after['commit'] or '?')[:10]))
+
+
+def print_comparison(before, after, before_label, after_label):
+    print('%s -> %s' % (before_label, after_label))
+    print('%-18s %21s %21s %21s' % ('route', 'p50 ms', 'p99 ms', 'rps'))
+
+    def change(key, old, new):
+        if key not in old or key not in new:
+            return '%21s' % '-'
+        delta = (new[key] - old[key]) / old[key] * 100 if old[key] else 0
+        return '%8s %6s %+5.0f%%' % (old[key], new[key], delta)
+
+    for name, new in after['routes'].items():
+        old = before['routes'].get(name, {})
+        print('%-18s %s %s %s' % (name, change('p50_ms', old, new), change('p99_ms', old, new),
+                                  change('rps', old, new)))
+
+
+def run(url, routes, ids, duration, concurrency):
+    """Drive each of ``routes`` in turn; the results with the commit and settings of the run."""
+    result = {
+        'commit': git_commit(),
+        'started_at': datetime.now(timezone.utc).isoformat(),
+        'url': url,
+        'duration': duration,
+        'concurrency': concurrency,
+        'routes': {},
+    }
+    for name, method, path in routes:
+        result['routes'][name] = drive(url, method, path, ids, duration, concurrency)
+    return result
+
+
+def selected_routes(names):
+    return [route for route in ROUTES if not names or route[0] in names.split(',')]
+
+
+def save(results, path):
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(results, f, indent=2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('url', nargs='?', default='http://127.0.0.1:5000')
+    parser.add_argument('--duration', type=float, default=10, help='Seconds per route.')
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--routes', help='Comma separated route names; all by default.')
+    parser.add_argument('--output', help='Save the results as JSON.')
+    parser.add_argument('--compare', nargs=2, metavar=('BEFORE', 'AFTER'), help='Compare two saved runs.')
+    args = parser.parse_args()
+
+    if args.compare:
+        return compare(*args.compare)
+
+    results = run(args.url, selected_routes(args.routes), sample_ids(), args.duration, args.concurrency)
+    print_results(results['routes'])
+
+    if args.output:
+        save(results, args.output)
+
+
+if __name__ == '__main__':
+    main()
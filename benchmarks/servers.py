@@ -0,0 +1,103 @@
+"""The routes of benchmarks.load under the development server and under gunicorn.
+
+    flask seed-synthetic --seed 1
+    python -m benchmarks.servers --workers 4 --threads 4 --output benchmarks/results/servers
+
+Each server is started from this checkout on its own port with debug and the response
+cache off, driven route by route with the same ids, concurrency and duration, and stopped.
+Both runs are printed, then compared with the development server as the baseline; with
+--output they are saved as dev.json and gunicorn.json for `benchmarks.load --compare`.
+"""
+import argparse
+import http.client
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks import load
+
+
+def dev_server(port, args, workdir):
+    # what `python app.py` starts: Werkzeug's server, one process, a thread per request
+    return [sys.executable, '-m', 'flask', '--app', 'app', 'run', '--port', str(port)]
+
+
+def gunicorn(port, args, workdir):
+    # gunicorn.conf.py, with the pool sized from the arguments
+    return [sys.executable, '-m', 'gunicorn', '--bind', '127.0.0.1:%d' % port, '--workers', str(args.workers),
+            '--threads', str(args.threads), '--pid', os.path.join(workdir, 'gunicorn.pid')]
+
+
+SERVERS = [('dev', dev_server), ('gunicorn', gunicorn)]
+
+
+def start(command, port, log, timeout=60):
+    env = dict(os.environ, FYYUR_DEBUG='0', FYYUR_CACHE_TYPE='null')
+    env.pop('FLASK_DEBUG', None)
+    process = subprocess.Popen(command, stdout=log, stderr=subprocess.STDOUT, env=env)
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline and process.poll() is None:
+        try:
+            connection = http.client.HTTPConnection('127.0.0.1', port, timeout=5)
+            connection.request('GET', '/')
+            connection.getresponse().read()
+            connection.close()
+            return process
+        except OSError:
+            time.sleep(0.2)
+    stop(process)
+    log.seek(0)
+    sys.exit('%s did not start:\n%s' % (' '.join(command), log.read().decode(errors='replace')[-2000:]))
+
+
+def stop(process):
+    if process.poll() is None:
+        process.send_signal(signal.SIGTERM)
+        try:
+            process.wait(30)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--threads', type=int, default=4)
+    parser.add_argument('--duration', type=float, default=10, help='Seconds per route.')
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--routes', help='Comma separated route names; all by default.')
+    parser.add_argument('--output', help='Directory to save the runs in.')
+    args = parser.parse_args()
+
+    routes = load.selected_routes(args.routes)
+    ids = load.sample_ids()
+    results = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        for name, command in SERVERS:
+            with tempfile.TemporaryFile() as log:
+                process = start(command(args.port, args, workdir), args.port, log)
+                try:
+                    results[name] = load.run('http://127.0.0.1:%d' % args.port, routes, ids, args.duration,
+                                             args.concurrency)
+                finally:
+                    stop(process)
+            results[name]['server'] = name
+            if name == 'gunicorn':
+                results[name].update(workers=args.workers, threads=args.threads)
+            print('%s\n' % name)
+            load.print_results(results[name]['routes'])
+            print()
+            if args.output:
+                load.save(results[name], os.path.join(args.output, '%s.json' % name))
+
+    load.print_comparison(results['dev'], results['gunicorn'], 'dev server',
+                          'gunicorn (%d workers x %d threads)' % (args.workers, args.threads))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,371 @@
+import csv
+import io
+import json
+import random
+import time
+import zlib
+from datetime import datetime, timedelta
+
+from werkzeug.datastructures import MultiDict
+
+from forms import Genre, VenueForm, ArtistForm, ShowForm
+from models import db, Venue, Artist, Show, check_show_counters, rollover_show_counters
+
+# kind -> (model, form, columns loaded from the file besides id)
+CATALOG = {
+    'venues': (Venue, VenueForm, ['name', 'city', 'state', 'address', 'phone', 'genres', 'website',
+                                  'facebook_link', 'image_link', 'seeking_talent', 'seeking_description']),
+    'artists': (Artist, ArtistForm, ['name', 'city', 'state', 'phone', 'genres', 'website', 'facebook_link',
+                                     'image_link', 'seeking_venue', 'seeking_description']),
+    'shows': (Show, ShowForm, ['venue_id', 'artist_id', 'start_time']),
+}
+
+FALSE_VALUES = ('', '0', 'f', 'false', 'n', 'no')
+# what ShowForm's start_time, and so validate(), reads: whole seconds, as the create page
+# stores them
+DATETIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+def read_rows(path, fmt):
+    """Yield one dict per CSV row or JSON line; CSV genres are separated by ';'."""
+    with open(path, newline='') as f:
+        if fmt == 'jsonl':
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+        else:
+            for row in csv.DictReader(f):
+                if row.get('genres') is not None:
+                    row['genres'] = [genre for genre in row['genres'].split(';') if genre]
+                yield row
+
+
+def validate(form_class, columns, row):
+    """Run a row through the same WTForms form the create pages use.
+
+    Returns (values, None) for a valid row and (None, errors) otherwise.
+    """
+    formdata = MultiDict()
+    for key, value in row.items():
+        if isinstance(value, bool):
+            value = 'y' if value else ''
+        if key in ('seeking_talent', 'seeking_venue') and str(value).lower() in FALSE_VALUES:
+            continue
+        if isinstance(value, list):
+            formdata.setlist(key, value)
+        elif value is not None:
+            formdata.add(key, str(value))
+
+    form = form_class(formdata=formdata, meta={'csrf': False})
+    if not form.validate():
+        return None, form.errors
+    # a required field the row leaves out passes with the form's default (ShowForm's
+    # start_time is the time the process started), which is never what a file meant
+    errors = {column: ['This field is required.'] for column in columns
+              if form[column].flags.required and row.get(column) in (None, '')}
+    values = {column: form[column].data for column in columns}
+    try:
+        values['id'] = int(row['id']) if row.get('id') not in (None, '') else None
+    except (TypeError, ValueError) as e:
+        errors['id'] = [str(e)]
+    for column in ('venue_id', 'artist_id'):
+        if column in values:
+            try:
+                values[column] = int(values[column])
+            except (TypeError, ValueError) as e:
+                errors[column] = [str(e)]
+    if errors:
+        return None, errors
+    return values, None
+
+
+def _copy_value(value):
+    if value is None:
+        return r'\N'
+    if isinstance(value, bool):
+        return 't' if value else 'f'
+    if isinstance(value, list):
+        return '{%s}' % ','.join('"%s"' % item.replace('\\', '\\\\').replace('"', '\\"') for item in value)
+    return value
+
+
+def _copy_in(cursor, sql, buffer):
+    if hasattr(cursor, 'copy_expert'):  # psycopg2
+        cursor.copy_expert(sql, buffer)
+    else:  # psycopg 3
+        with cursor.copy(sql) as copy:
+            copy.write(buffer.getvalue())
+
+
+def _upsert_sql(model, columns):
+    table = '"%s"' % model.__tablename__
+    names = ', '.join(columns)
+    updates = ', '.join('%s = EXCLUDED.%s' % (column, column) for column in columns)
+    if model is Show:
+        # shows whose venue or artist does not exist are skipped rather than failing the batch
+        return (
+            'INSERT INTO {table} (id, {names}, is_upcoming) '
+            'SELECT coalesce(s.id, nextval(pg_get_serial_sequence(\'{table}\', \'id\'))), {s_names}, '
+            's.start_time > LOCALTIMESTAMP FROM import_staging s '
+            'WHERE EXISTS (SELECT 1 FROM "Venue" v WHERE v.id = s.venue_id) '
+            'AND EXISTS (SELECT 1 FROM "Artist" a WHERE a.id = s.artist_id) '
+            'ON CONFLICT (id) DO UPDATE SET {updates}, is_upcoming = EXCLUDED.is_upcoming'
+        ).format(table=table, names=names, updates=updates, s_names=', '.join('s.' + c for c in columns))
+    return (
+        'INSERT INTO {table} (id, {names}) '
+        'SELECT coalesce(id, nextval(pg_get_serial_sequence(\'{table}\', \'id\'))), {names} FROM import_staging '
+        'ON CONFLICT (id) DO UPDATE SET {updates}, updated_at = (now() at time zone \'utc\')'
+    ).format(table=table, names=names, updates=updates)
+
+
+def import_catalog(kind, rows, batch_size=10000, on_invalid=None):
+    """Load ``rows`` into the ``kind`` table through COPY into a temporary staging table
+    and an ``INSERT ... ON CONFLICT (id) DO UPDATE`` per batch.
+
+    Rows failing form validation are passed to ``on_invalid(line, errors)`` and skipped.
+    Returns a dict with read/invalid/upserted counts and the elapsed seconds.
+    """
+    model, form_class, columns = CATALOG[kind]
+    table = '"%s"' % model.__tablename__
+    stats = {'read': 0, 'invalid': 0, 'upserted': 0}
+    started = time.perf_counter()
+
+    connection = db.engine.raw_connection()
+    try:
+        cursor = connection.cursor()
+        # same column types as the target, none of its constraints; emptied by every commit
+        cursor.execute('CREATE TEMP TABLE import_staging ON COMMIT DELETE ROWS AS '
+                       'SELECT id, {names} FROM {table} WITH NO DATA'.format(names=', '.join(columns), table=table))
+        copy_sql = 'COPY import_staging (id, {names}) FROM STDIN WITH (FORMAT csv, NULL \'\\N\')'.format(
+            names=', '.join(columns))
+        upsert_sql = _upsert_sql(model, columns)
+
+        def flush(buffer):
+            buffer.seek(0)
+            _copy_in(cursor, copy_sql, buffer)
+            cursor.execute(upsert_sql)
+            stats['upserted'] += cursor.rowcount
+            connection.commit()
+
+        buffer = io.StringIO()
+        writer, pending = csv.writer(buffer), 0
+        for line, row in enumerate(rows, 1):
+            stats['read'] += 1
+            values, errors = validate(form_class, columns, row)
+            if errors:
+                stats['invalid'] += 1
+                if on_invalid:
+                    on_invalid(line, errors)
+                continue
+            writer.writerow([_copy_value(values['id'])] + [_copy_value(values[column]) for column in columns])
+            pending += 1
+            if pending >= batch_size:
+                flush(buffer)
+                buffer = io.StringIO()
+                writer, pending = csv.writer(buffer), 0
+        if pending:
+            flush(buffer)
+
+        # explicit ids bypass the sequence; move it past them
+        cursor.execute('SELECT setval(pg_get_serial_sequence(\'{table}\', \'id\'), '
+                       'coalesce(max(id), 0) + 1, false) FROM {table}'.format(table=table))
+        connection.commit()
+    finally:
+        # the temporary table lives as long as the pooled connection, so it is dropped here,
+        # also after a batch failed with earlier ones committed
+        try:
+            connection.rollback()
+            connection.cursor().execute('DROP TABLE IF EXISTS import_staging')
+            connection.commit()
+        except Exception:
+            # the connection is discarded instead, and its temporary table with it
+            connection.invalidate()
+        connection.close()
+
+    if model is Show:
+        # the upserts bypassed count_new_show(); bring the counters back in line in bulk
+        rollover_show_counters()
+        check_show_counters(repair=True)
+
+    stats['seconds'] = time.perf_counter() - started
+    return stats
+
+
+def _export_value(value, fmt):
+    if isinstance(value, datetime):
+        return value.strftime(DATETIME_FORMAT)
+    if isinstance(value, list) and fmt == 'csv':
+        return ';'.join(value)
+    return value
+
+
+def export_catalog(kind, fmt='csv', compress=False, batch_size=5000):
+    """Yield the whole ``kind`` table as CSV or NDJSON byte chunks, optionally gzipped.
+
+    Rows are read through a server-side cursor ``batch_size`` at a time and each batch is
+    encoded and yielded before the next is fetched, so memory stays flat however large
+    the table is.  CSV genres are joined with ';' and times written to the second, the
+    formats import_catalog() reads.
+    """
+    model = CATALOG[kind][0]
+    columns = list(model.__table__.columns)
+    names = [column.name for column in columns]
+    rows = db.session.query(*columns).order_by(model.id).yield_per(batch_size)
+    gzip = zlib.compressobj(wbits=31) if compress else None
+
+    def encode(text):
+        data = text.encode()
+        return gzip.compress(data) if gzip else data
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if fmt == 'csv':
+        writer.writerow(names)
+
+    for index, row in enumerate(rows, 1):
+        values = [_export_value(value, fmt) for value in row]
+        if fmt == 'csv':
+            writer.writerow(values)
+        else:
+            buffer.write(json.dumps(dict(zip(names, values))) + '\n')
+        if index % batch_size == 0:
+            yield encode(buffer.getvalue())
+            buffer.seek(0)
+            buffer.truncate()
+
+    tail = encode(buffer.getvalue())
+    if gzip:
+        tail += gzip.flush()
+    if tail:
+        yield tail
+
+
+#  Synthetic data
+#  ----------------------------------------------------------------
+
+GENRES = [genre.value for genre in Genre]
+STATES = [state for state, _ in VenueForm.state.kwargs['choices']]
+NAME_WORDS = ['Red', 'Blue', 'Golden', 'Silver', 'Velvet', 'Electric', 'Midnight', 'Wild', 'Lucky', 'Rusty',
+              'Crimson', 'Hollow', 'Broken', 'Neon', 'Quiet', 'Loud', 'Lonely', 'Happy', 'Iron', 'Paper',
+              'Fox', 'Crow', 'Lantern', 'Harbor', 'Garden', 'Tavern', 'Cellar', 'Parlor', 'Engine', 'Orchard',
+              'River', 'Canyon', 'Mirror', 'Anchor', 'Comet', 'Thunder', 'Willow', 'Sparrow', 'Piano', 'Drum']
+CITY_WORDS = ['Spring', 'Oak', 'Maple', 'Cedar', 'River', 'Lake', 'Fair', 'Green', 'Clear', 'Glen']
+CITY_SUFFIXES = ['field', 'ville', 'ton', 'wood', 'port', 'view', 'dale', 'burg', 'haven', 'side']
+
+
+def _synthetic_rows(kind, count, first_id, rng, **ids):
+    cities = [(word + suffix, state) for word in CITY_WORDS for suffix in CITY_SUFFIXES
+              for state in rng.sample(STATES, 3)]
+    now = datetime.now().replace(microsecond=0)
+    for id in range(first_id, first_id + count):
+        if kind == 'shows':
+            # 3 years of history and 1 of announced shows, evening starts on the hour
+            start_time = now.replace(minute=0, second=0) + timedelta(days=rng.randint(-3 * 365, 365),
+                                                                      hours=rng.randint(-4, 4))
+            yield [id, rng.choice(ids['venues']), rng.choice(ids['artists']), start_time,
+                   start_time > now]
+            continue
+        city, state = rng.choice(cities)
+        name = '%s %s %s' % (rng.choice(NAME_WORDS), rng.choice(NAME_WORDS), id)
+        genres = rng.sample(GENRES, rng.randint(1, 3))
+        phone = '%03d-%03d-%04d' % (rng.randint(200, 999), rng.randint(200, 999), rng.randint(0, 9999))
+        seeking = rng.random() < 0.3
+        row = [id, ('The %s' % name) if kind == 'venues' else name, city, state, phone, genres,
+               'https://example.com/%s/%d' % (kind, id), 'https://www.facebook.com/%s%d' % (kind, id),
+               'https://picsum.photos/seed/%s%d/300/300' % (kind, id), seeking,
+               'Looking for %s acts' % genres[0] if seeking else None]
+        if kind == 'venues':
+            row.insert(4, '%d %s St' % (rng.randint(1, 9999), rng.choice(NAME_WORDS)))
+        yield row
+
+
+SYNTHETIC_COLUMNS = {
+    'venues': ['id', 'name', 'city', 'state', 'address', 'phone', 'genres', 'website', 'facebook_link',
+               'image_link', 'seeking_talent', 'seeking_description'],
+    'artists': ['id', 'name', 'city', 'state', 'phone', 'genres', 'website', 'facebook_link', 'image_link',
+                'seeking_venue', 'seeking_description'],
+    'shows': ['id', 'venue_id', 'artist_id', 'start_time', 'is_upcoming'],
+}
+
+
+def generate_catalog(venues, artists, shows, seed=None, batch_size=50000, on_progress=None):
+    """Append ``venues``, ``artists`` and ``shows`` rows of random but plausible data.
+
+    Rows are COPYed straight into the tables ``batch_size`` at a time, skipping the form
+    validation import_catalog() does.  Genres and states come from forms.py, show times
+    spread over the last three years and the next one, and each show picks its venue and
+    artist uniformly from all those in the tables.  ``on_progress(kind, rows)`` is called
+    after each batch.
+
+    Each table is loaded in one transaction.  When it gains more rows than it holds, its
+    secondary indexes are dropped for the load and rebuilt in that transaction, which is
+    much faster than maintaining them row by row; the table is locked until it commits.
+    The counters are rebuilt and the tables analyzed afterwards.
+    """
+    rng = random.Random(seed)
+    stats = {}
+    ids = {}
+
+    connection = db.engine.raw_connection()
+    try:
+        cursor = connection.cursor()
+        # a crash can lose the last commits of a load, never corrupt it
+        cursor.execute('SET synchronous_commit TO off')
+        for kind, count in (('venues', venues), ('artists', artists), ('shows', shows)):
+            model = CATALOG[kind][0]
+            table = '"%s"' % model.__tablename__
+            if kind == 'shows' and count and not (ids['venues'] and ids['artists']):
+                raise ValueError('shows need venues and artists to refer to')
+            started = time.perf_counter()
+            cursor.execute('SELECT coalesce(max(id), 0) + 1 FROM %s' % table)
+            first_id = cursor.fetchone()[0]
+
+            indexes = []
+            if count >= first_id:
+                cursor.execute('SELECT indexrelid::regclass::text, pg_get_indexdef(indexrelid) FROM pg_index '
+                               'WHERE indrelid = %s::regclass AND NOT indisprimary AND NOT indisunique', (table,))
+                indexes = cursor.fetchall()
+                for name, _ in indexes:
+                    cursor.execute('DROP INDEX %s' % name)
+
+            copy_sql = 'COPY {table} ({names}) FROM STDIN WITH (FORMAT csv, NULL \'\\N\')'.format(
+                table=table, names=', '.join(SYNTHETIC_COLUMNS[kind]))
+            buffer = io.StringIO()
+            writer, pending = csv.writer(buffer), 0
+            for row in _synthetic_rows(kind, count, first_id, rng, **ids):
+                writer.writerow([_copy_value(value) for value in row])
+                pending += 1
+                if pending == batch_size:
+                    buffer.seek(0)
+                    _copy_in(cursor, copy_sql, buffer)
+                    if on_progress:
+                        on_progress(kind, pending)
+                    buffer = io.StringIO()
+                    writer, pending = csv.writer(buffer), 0
+            if pending:
+                buffer.seek(0)
+                _copy_in(cursor, copy_sql, buffer)
+                if on_progress:
+                    on_progress(kind, pending)
+
+            for _, definition in indexes:
+                cursor.execute(definition)
+            cursor.execute('SELECT setval(pg_get_serial_sequence(\'{table}\', \'id\'), '
+                           'coalesce(max(id), 0) + 1, false) FROM {table}'.format(table=table))
+            connection.commit()
+            if kind != 'shows':
+                cursor.execute('SELECT id FROM %s' % table)
+                ids[kind] = [id for id, in cursor.fetchall()]
+            stats[kind] = {'rows': count, 'seconds': time.perf_counter() - started}
+
+        started = time.perf_counter()
+        cursor.execute('ANALYZE "Venue", "Artist", "Show"')
+        connection.commit()
+        stats['analyze'] = {'seconds': time.perf_counter() - started}
+    finally:
+        connection.close()
+
+    started = time.perf_counter()
+    check_show_counters(repair=True)
+    stats['counters'] = {'seconds': time.perf_counter() - started}
+    return stats
@@ -0,0 +1,203 @@
+import pickle
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from datetime import timezone
+from functools import wraps
+
+from flask import request, session, current_app, g
+
+
+class NullCache(object):
+    """Backend that stores nothing; every lookup misses."""
+
+    local = False
+
+    def get_many(self, keys):
+        return [None] * len(keys)
+
+    def set(self, key, value):
+        pass
+
+
+class LRUCache(object):
+    """In-process backend: at most ``max_entries`` entries, each living ``ttl`` seconds,
+    least recently used evicted first.  Invalidations are only seen by this process."""
+
+    local = True
+
+    def __init__(self, max_entries=1000, ttl=300):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _get(self, key, now):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires, value = entry
+        if expires < now:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def get_many(self, keys):
+        now = time.monotonic()
+        with self._lock:
+            return [self._get(key, now) for key in keys]
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+class RedisCache(object):
+    """Shared backend for multi-process deployments.  Entries expire after ``ttl``; size is
+    bounded by the server's ``maxmemory`` with ``maxmemory-policy allkeys-lru``.  Any local
+    redis-server (or a compatible stand-in) works for development."""
+
+    local = False
+
+    def __init__(self, url, ttl=300, prefix='fyyur:'):
+        import redis
+
+        self.client = redis.Redis.from_url(url)
+        self.ttl = ttl
+        self.prefix = prefix
+
+    def get_many(self, keys):
+        values = self.client.mget([self.prefix + key for key in keys])
+        return [pickle.loads(value) if value is not None else None for value in values]
+
+    def set(self, key, value):
+        self.client.set(self.prefix + key, pickle.dumps(value), ex=self.ttl)
+
+
+class ResponseCache(object):
+    """Caches rendered GET responses, keyed by URL and by the versions of the entity tags
+    the page depends on (e.g. ``'venues'``, ``'venue:3'``).
+
+    Writers call ``invalidate(tag, ...)``, which gives those tags a fresh version; every
+    page rendered against an older version stops matching and ages out of the backend.
+    A tag is stored with the same TTL as the pages, so by the time it expires (and reads
+    as version 0 again) the pages cached under version 0 have expired as well.
+    """
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        cache_type = app.config.get('CACHE_TYPE', 'null')
+        if cache_type == 'simple':
+            backend = LRUCache(app.config.get('CACHE_MAX_ENTRIES', 1000), app.config.get('CACHE_TTL', 300))
+        elif cache_type == 'redis':
+            backend = RedisCache(app.config['CACHE_REDIS_URL'], app.config.get('CACHE_TTL', 300))
+        elif cache_type == 'null':
+            backend = NullCache()
+        else:
+            raise ValueError('Unknown CACHE_TYPE %r' % cache_type)
+        app.extensions['response_cache'] = backend
+
+    @property
+    def backend(self):
+        """The backend of the current app."""
+        return current_app.extensions['response_cache']
+
+    @property
+    def local(self):
+        """Whether the current app's pages, and their invalidations, live in this process
+        only ('simple'), out of reach of any other process such as a CLI command."""
+        return self.backend.local
+
+    def invalidate(self, *tags):
+        for tag in set(tags):
+            self.backend.set('tag:' + tag, uuid.uuid4().hex)
+
+    def cached(self, *tags):
+        """Cache a view under ``tags``; tags are formatted with the view arguments, so
+        ``'venue:{venue_id}'`` on ``show_venue`` becomes ``'venue:3'``."""
+
+        def decorator(view):
+            @wraps(view)
+            def wrapper(**kwargs):
+                # pages carrying flashed messages are per-user and must not be shared
+                if request.method != 'GET' or session.get('_flashes'):
+                    return view(**kwargs)
+
+                tag_keys = ['tag:' + tag.format(**kwargs) for tag in tags]
+                versions = self.backend.get_many(tag_keys)
+                key = 'page:%s:%s' % (request.full_path, ':'.join(str(version or 0) for version in versions))
+                # under conditional_get, the page is also keyed by the ETag sent with it, so a
+                # body cached before a write (and not yet invalidated, e.g. in another worker)
+                # is never served under the ETag of the new version
+                if g.get('etag'):
+                    key += ':' + g.etag
+
+                hit = self.backend.get_many([key])[0]
+                if hit is not None:
+                    body, status, mimetype = hit
+                    return current_app.response_class(body, status=status, mimetype=mimetype)
+
+                response = current_app.make_response(view(**kwargs))
+                if response.status_code == 200 and not response.is_streamed and not g.get('skip_response_cache'):
+                    self.backend.set(key, (response.get_data(), response.status_code, response.mimetype))
+                return response
+
+            return wrapper
+
+        return decorator
+
+
+def conditional_get(last_modified, variant=None):
+    """Answer If-None-Match / If-Modified-Since with 304 before the view runs.
+
+    ``last_modified(**view_args)`` returns the naive UTC time the page's entity last
+    changed, or None to skip validation (e.g. the entity does not exist).  When one URL
+    returns different bodies depending on its query (e.g. ``?fields=`` on the API),
+    ``variant()`` names the one requested (or returns '' for the default), and each gets its
+    own ETag.  Fresh responses
+    carry the matching ETag and Last-Modified headers, with ``Cache-Control: no-cache`` so
+    clients revalidate on every visit.  Put it outside ``ResponseCache.cached``, which keys
+    the cached body by that ETag.
+    """
+
+    def decorator(view):
+        @wraps(view)
+        def wrapper(**kwargs):
+            if session.get('_flashes'):
+                return view(**kwargs)
+            stamp = last_modified(**kwargs)
+            if stamp is None:
+                return view(**kwargs)
+
+            # the ETag keeps the microseconds, so two writes within a second differ;
+            # Last-Modified only has whole seconds
+            stamp = stamp.replace(tzinfo=timezone.utc)
+            seconds = stamp.replace(microsecond=0)
+            etag = '%s-%d.%06d' % (request.path, seconds.timestamp(), stamp.microsecond)
+            name = variant() if variant is not None else None
+            if name:
+                etag += '-' + name
+            if request.if_none_match:
+                not_modified = request.if_none_match.contains(etag)
+            else:
+                not_modified = request.if_modified_since is not None and request.if_modified_since >= seconds
+
+            g.etag = etag
+            response = current_app.response_class(status=304) if not_modified \
+                else current_app.make_response(view(**kwargs))
+            response.set_etag(etag)
+            response.last_modified = seconds
+            response.cache_control.no_cache = True
+            return response
+
+        return wrapper
+
+    return decorator
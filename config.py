@@ -1,13 +1,96 @@
 import os
-SECRET_KEY = os.urandom(32)
+# Signs sessions and CSRF tokens, so every worker must share it.  Unset, create_app()
+# generates one into instance/secret_key on first start and reuses it from then on.
+SECRET_KEY = os.environ.get('FYYUR_SECRET_KEY')
 # Grabs the folder where the script runs.
 basedir = os.path.abspath(os.path.dirname(__file__))
 
-# Enable debug mode.
-DEBUG = True
+# Debug mode (interactive debugger, template reloading, no error.log): FYYUR_DEBUG=1, or
+# `flask --debug run`.  Off by default, and never on under gunicorn in production.
+DEBUG = os.environ.get('FYYUR_DEBUG', os.environ.get('FLASK_DEBUG', '')).lower() in ('1', 'true')
 
 # Connect to the database
 
 
 #  IMPLEMENT DATABASE URL
-SQLALCHEMY_DATABASE_URI = 'postgresql://jxorange@localhost:5432/fyyur'
\ No newline at end of file
+SQLALCHEMY_DATABASE_URI = os.environ.get('FYYUR_DATABASE_URL', 'postgresql://jxorange@localhost:5432/fyyur')
+
+# Read replicas, comma separated.  Read-only views go to a replica lagging at most
+# REPLICA_MAX_LAG seconds; a client that just wrote stays on the primary for
+# READ_YOUR_WRITES_SECONDS.
+SQLALCHEMY_BINDS = {
+    'replica_%d' % index: url
+    for index, url in enumerate(filter(None, os.environ.get('FYYUR_DATABASE_REPLICA_URLS', '').split(',')))
+}
+REPLICA_MAX_LAG = float(os.environ.get('FYYUR_REPLICA_MAX_LAG', 5))
+REPLICA_LAG_CHECK_INTERVAL = float(os.environ.get('FYYUR_REPLICA_LAG_CHECK_INTERVAL', 1))
+READ_YOUR_WRITES_SECONDS = float(os.environ.get('FYYUR_READ_YOUR_WRITES_SECONDS', 10))
+
+# Connection pool, per worker process.  Size it from the fyyur_db_pool_wait_seconds
+# metric on /metrics: sustained waits mean the pool is too small for the thread count.
+DB_POOL_SIZE = int(os.environ.get('FYYUR_DB_POOL_SIZE', 5))
+DB_MAX_OVERFLOW = int(os.environ.get('FYYUR_DB_MAX_OVERFLOW', 10))
+DB_POOL_TIMEOUT = int(os.environ.get('FYYUR_DB_POOL_TIMEOUT', 30))
+DB_POOL_RECYCLE = int(os.environ.get('FYYUR_DB_POOL_RECYCLE', 1800))
+DB_POOL_PRE_PING = os.environ.get('FYYUR_DB_POOL_PRE_PING', '1') == '1'
+# Milliseconds; 0 disables the timeout.
+DB_STATEMENT_TIMEOUT = int(os.environ.get('FYYUR_DB_STATEMENT_TIMEOUT', 0))
+# Behind pgbouncer in transaction pooling mode: no startup options (set the statement
+# timeout on the database role instead) and no server-side prepared statements.
+DB_PGBOUNCER = os.environ.get('FYYUR_DB_PGBOUNCER', '') == '1'
+
+# Database URL for the async views served by asgi.py; empty means SQLALCHEMY_DATABASE_URI
+# with its driver swapped for asyncpg.  The pool settings above apply to it as well, unless
+# DB_PGBOUNCER is set: then pgbouncer pools its connections.
+ASYNC_DATABASE_URL = os.environ.get('FYYUR_ASYNC_DATABASE_URL', '')
+
+# Name search: 'trigram' ranks matches by pg_trgm similarity and also returns close
+# misspellings; 'substring' is a plain ILIKE ordered by name.
+SEARCH_MODE = os.environ.get('FYYUR_SEARCH_MODE', 'trigram')
+# Most matches a search returns, best first.
+SEARCH_LIMIT = int(os.environ.get('FYYUR_SEARCH_LIMIT', 100))
+
+# Rows per page on the /venues, /artists and /shows listings.
+PAGE_SIZE = int(os.environ.get('FYYUR_PAGE_SIZE', 50))
+
+# Stream the full /shows listing from a server-side cursor instead of paginating it,
+# fetching STREAM_BATCH_SIZE rows at a time.
+STREAM_SHOWS = os.environ.get('FYYUR_STREAM_SHOWS', '') == '1'
+STREAM_BATCH_SIZE = int(os.environ.get('FYYUR_STREAM_BATCH_SIZE', 1000))
+
+# Response cache for the read pages: 'simple' is an in-process LRU (invalidations are
+# only seen by the worker that made the write), 'redis' is shared across workers via
+# CACHE_REDIS_URL (needs the redis package), 'null' disables caching.  The flask commands
+# that write (import-catalog, seed-synthetic, rollover-shows, check-show-counters) run in
+# a process of their own and only reach the servers' pages through 'redis'; under
+# 'simple' they warn that pages may stay stale for CACHE_TTL.
+CACHE_TYPE = os.environ.get('FYYUR_CACHE_TYPE', 'simple')
+CACHE_REDIS_URL = os.environ.get('FYYUR_CACHE_REDIS_URL', 'redis://localhost:6379/0')
+CACHE_MAX_ENTRIES = int(os.environ.get('FYYUR_CACHE_MAX_ENTRIES', 1000))
+CACHE_TTL = int(os.environ.get('FYYUR_CACHE_TTL', 300))
+
+# Statements a request may issue before RequestTimer logs a warning, per endpoint, with
+# QUERY_COUNT_THRESHOLD for the rest.  The read pages are held to what they issue now,
+# the bounds test_queries.py enforces; the replica lag probes are not counted.  Add or
+# override entries with FYYUR_QUERY_COUNT_THRESHOLDS=fyyur.show_venue=4,fyyur.venues=2.
+QUERY_COUNT_THRESHOLD = int(os.environ.get('FYYUR_QUERY_COUNT_THRESHOLD', 20))
+QUERY_COUNT_THRESHOLDS = {
+    'fyyur.index': 0,
+    'fyyur.venues': 1,
+    'fyyur.artists': 1,
+    'fyyur.shows': 1,
+    'fyyur.search_venues': 1,
+    'fyyur.search_artists': 1,
+    'fyyur.show_venue': 3,
+    'fyyur.show_artist': 3,
+    'fyyur.api_venues': 1,
+    'fyyur.api_artists': 1,
+    'fyyur.api_shows': 1,
+    'fyyur.api_venue': 3,
+    'fyyur.api_artist': 3,
+    'fyyur.api_show': 1,
+}
+QUERY_COUNT_THRESHOLDS.update(
+    (endpoint, int(limit)) for endpoint, limit in (
+        item.split('=') for item in filter(None, os.environ.get('FYYUR_QUERY_COUNT_THRESHOLDS', '').split(',')))
+)
@@ -0,0 +1,57 @@
+"""Production server: gunicorn, started from this directory, which reads this file.
+
+    gunicorn                              # or with any setting overridden on the command line:
+    gunicorn --workers 8 --threads 2
+
+The master imports and builds the app once (preload_app) and forks the workers from it.
+Each worker is a process serving ``threads`` requests at a time, each with its own database
+pool of DB_POOL_SIZE connections (plus DB_MAX_OVERFLOW), so keep threads <= DB_POOL_SIZE and
+workers * (DB_POOL_SIZE + DB_MAX_OVERFLOW) under the server's max_connections.
+
+The response cache is off unless FYYUR_CACHE_TYPE is set: the default 'simple' cache lives
+in one process and only sees that worker's invalidations, so the server refuses to start
+with it and more than one worker.  Use FYYUR_CACHE_TYPE=redis.
+
+Signals to the master:
+
+    HUP        re-read this file and replace the workers gracefully, each finishing the
+               requests it has in flight; the preloaded code is reused as it is
+    USR2       start a new master on the new code next to the old one; once it serves,
+               TERM the old one (its pid is in gunicorn.pid.oldbin) to finish gracefully
+    TTIN/TTOU  one worker more/less
+"""
+import multiprocessing
+import os
+import sys
+
+# before the app (and config.py) is loaded
+os.environ.setdefault('FYYUR_CACHE_TYPE', 'null')
+
+wsgi_app = 'app:create_app()'
+preload_app = True
+
+bind = os.environ.get('FYYUR_BIND', '0.0.0.0:%s' % os.environ.get('PORT', 8000))
+workers = int(os.environ.get('FYYUR_WORKERS', multiprocessing.cpu_count()))
+threads = int(os.environ.get('FYYUR_THREADS', 4))
+worker_class = 'gthread'
+
+# Seconds an idle client connection is held open for its next request.
+keepalive = int(os.environ.get('FYYUR_KEEPALIVE', 5))
+# A worker silent for `timeout` seconds is killed and replaced; on reload or shutdown a
+# worker gets `graceful_timeout` seconds to finish its requests.
+timeout = int(os.environ.get('FYYUR_TIMEOUT', 30))
+graceful_timeout = int(os.environ.get('FYYUR_GRACEFUL_TIMEOUT', 30))
+# Replace each worker after about this many requests (0 never), bounding the memory one
+# can accumulate; the jitter keeps the workers from restarting all at once.
+max_requests = int(os.environ.get('FYYUR_MAX_REQUESTS', 1000))
+max_requests_jitter = int(os.environ.get('FYYUR_MAX_REQUESTS_JITTER', 100))
+
+pidfile = os.environ.get('FYYUR_PIDFILE', 'gunicorn.pid')
+accesslog = os.environ.get('FYYUR_ACCESS_LOG') or None
+errorlog = '-'
+
+
+def on_starting(server):
+    if server.cfg.workers > 1 and os.environ['FYYUR_CACHE_TYPE'] == 'simple':
+        sys.exit("FYYUR_CACHE_TYPE=simple caches per worker, and a write would only invalidate its "
+                 "own worker's pages; run one worker, or use FYYUR_CACHE_TYPE=redis or null.")
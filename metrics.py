@@ -0,0 +1,174 @@
+import json
+import threading
+import time
+
+from flask import g, request, current_app, has_request_context, before_render_template, template_rendered
+from sqlalchemy import event
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.pool import QueuePool
+
+
+class Histogram(object):
+    """Thread-safe cumulative histogram rendered in the Prometheus text format."""
+
+    def __init__(self, name, help, buckets=(.001, .005, .01, .05, .1, .5, 1, 5)):
+        self.name = name
+        self.help = help
+        self.buckets = buckets
+        self._counts = [0] * len(buckets)
+        self._count = 0
+        self._sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        with self._lock:
+            self._count += 1
+            self._sum += value
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    self._counts[index] += 1
+
+    def render(self):
+        with self._lock:
+            lines = ['# HELP %s %s' % (self.name, self.help), '# TYPE %s histogram' % self.name]
+            for bound, count in zip(self.buckets, self._counts):
+                lines.append('%s_bucket{le="%s"} %d' % (self.name, bound, count))
+            lines.append('%s_bucket{le="+Inf"} %d' % (self.name, self._count))
+            lines.append('%s_sum %f' % (self.name, self._sum))
+            lines.append('%s_count %d' % (self.name, self._count))
+        return lines
+
+
+pool_wait = Histogram('fyyur_db_pool_wait_seconds', 'Time spent checking a connection out of the pool, including opening new ones.')
+
+
+class TimedQueuePool(QueuePool):
+    """QueuePool that records how long each checkout waited in ``pool_wait``."""
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super(TimedQueuePool, self)._do_get()
+        finally:
+            pool_wait.observe(time.perf_counter() - started)
+
+
+def engine_options(config):
+    """SQLALCHEMY_ENGINE_OPTIONS built from the DB_* settings in config.py."""
+    connect_args = {}
+    if config['DB_STATEMENT_TIMEOUT'] and not config['DB_PGBOUNCER']:
+        connect_args['options'] = '-c statement_timeout=%d' % config['DB_STATEMENT_TIMEOUT']
+    if config['DB_PGBOUNCER'] and make_url(config['SQLALCHEMY_DATABASE_URI']).get_dialect().driver == 'psycopg':
+        # psycopg 3 prepares repeated statements on the server; psycopg2 never does
+        connect_args['prepare_threshold'] = None
+
+    return {
+        'poolclass': TimedQueuePool,
+        'pool_size': config['DB_POOL_SIZE'],
+        'max_overflow': config['DB_MAX_OVERFLOW'],
+        'pool_timeout': config['DB_POOL_TIMEOUT'],
+        'pool_recycle': config['DB_POOL_RECYCLE'],
+        'pool_pre_ping': config['DB_POOL_PRE_PING'],
+        'connect_args': connect_args,
+    }
+
+
+def render_pool(pool):
+    lines = []
+    for name, help, value in (
+            ('fyyur_db_pool_size', 'Configured pool size.', pool.size()),
+            ('fyyur_db_pool_checked_out', 'Connections currently checked out.', pool.checkedout()),
+            ('fyyur_db_pool_overflow', 'Overflow connections currently open.', max(pool.overflow(), 0))):
+        lines += ['# HELP %s %s' % (name, help), '# TYPE %s gauge' % name, '%s %d' % (name, value)]
+    return lines
+
+
+class RequestTimer(object):
+    """Times every request: the statements it issues and their total duration, template
+    rendering and the whole handler, from before_request to after_request.
+
+    The figures are sent back in a ``Server-Timing`` header (shown per request in the
+    browser's network panel) and logged as one JSON line.  A request issuing more
+    statements than QUERY_COUNT_THRESHOLDS allows its endpoint (QUERY_COUNT_THRESHOLD for
+    the others) also logs a warning, so a page slipping back into N+1 queries shows up.
+    Statements executed with the ``uncounted`` execution option (the replica lag probes,
+    which come and go with REPLICA_LAG_CHECK_INTERVAL) are left out of both figures.
+    Statements run concurrently (the async pages in asgi.py) add up, so there db can
+    exceed app.  A streamed body (STREAM_SHOWS) runs after after_request, so its response
+    gets no header and its log line only the time to the response.
+    """
+
+    def __init__(self, app=None):
+        # every engine, so statements sent to a replica are counted as well
+        event.listen(Engine, 'before_cursor_execute', self._query_started)
+        event.listen(Engine, 'after_cursor_execute', self._query_finished)
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.before_request(self._start)
+        app.after_request(self._report)
+        before_render_template.connect(self._template_started, app)
+        template_rendered.connect(self._template_finished, app)
+        app.extensions['request_timer'] = self
+
+    def _start(self):
+        g.request_timing = {'started': time.perf_counter(), 'queries': 0, 'sql': 0.0, 'template': 0.0}
+
+    def _query_started(self, connection, cursor, statement, parameters, context, executemany):
+        connection.info.setdefault('query_started', []).append(time.perf_counter())
+
+    def _query_finished(self, connection, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - connection.info['query_started'].pop()
+        if context is not None and context.execution_options.get('uncounted'):
+            return
+        timing = g.get('request_timing') if has_request_context() else None
+        if timing is not None:
+            timing['queries'] += 1
+            timing['sql'] += elapsed
+
+    def _template_started(self, sender, template, context, **extra):
+        if 'request_timing' in g:
+            g.request_timing['template_started'] = time.perf_counter()
+
+    def _template_finished(self, sender, template, context, **extra):
+        timing = g.get('request_timing')
+        if timing is not None and 'template_started' in timing:
+            timing['template'] += time.perf_counter() - timing.pop('template_started')
+
+    def _report(self, response):
+        timing = g.pop('request_timing', None)
+        if timing is None:
+            return response
+        total = time.perf_counter() - timing['started']
+        if response.is_streamed:
+            # the body, and every query and template block in it, is produced after this
+            # hook: no Server-Timing header or query count, only the time to the response
+            current_app.logger.info(json.dumps({
+                'method': request.method,
+                'path': request.full_path.rstrip('?'),
+                'endpoint': request.endpoint,
+                'status': response.status_code,
+                'streamed': True,
+                'total_ms': round(total * 1000, 2),
+            }))
+            return response
+        response.headers.add('Server-Timing', 'db;dur=%.1f;desc="%d queries", tpl;dur=%.1f, app;dur=%.1f' % (
+            timing['sql'] * 1000, timing['queries'], timing['template'] * 1000, total * 1000))
+
+        current_app.logger.info(json.dumps({
+            'method': request.method,
+            'path': request.full_path.rstrip('?'),
+            'endpoint': request.endpoint,
+            'status': response.status_code,
+            'queries': timing['queries'],
+            'sql_ms': round(timing['sql'] * 1000, 2),
+            'template_ms': round(timing['template'] * 1000, 2),
+            'total_ms': round(total * 1000, 2),
+        }))
+        threshold = (current_app.config.get('QUERY_COUNT_THRESHOLDS') or {}).get(
+            request.endpoint, current_app.config.get('QUERY_COUNT_THRESHOLD'))
+        if threshold is not None and timing['queries'] > threshold:
+            current_app.logger.warning('%s %s issued %d queries, over the threshold of %d for %s',
+                                       request.method, request.path, timing['queries'], threshold, request.endpoint)
+        return response
@@ -0,0 +1,42 @@
+"""show counters on Venue and Artist
+
+Revision ID: 3f1c9a7d2b60
+Revises: c1e05633671d
+Create Date: 2026-10-17 09:12:40.118204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f1c9a7d2b60'
+down_revision = 'c1e05633671d'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('Show', sa.Column('is_upcoming', sa.Boolean(), server_default='false', nullable=False))
+    op.add_column('Venue', sa.Column('upcoming_show_count', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('Venue', sa.Column('past_show_count', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('Artist', sa.Column('upcoming_show_count', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('Artist', sa.Column('past_show_count', sa.Integer(), server_default='0', nullable=False))
+
+    # backfill from the existing shows
+    op.execute('UPDATE "Show" SET is_upcoming = start_time > LOCALTIMESTAMP')
+    for table, key in (('Venue', 'venue_id'), ('Artist', 'artist_id')):
+        op.execute(
+            'UPDATE "{table}" SET '
+            'upcoming_show_count = (SELECT count(*) FROM "Show" WHERE "Show".{key} = "{table}".id AND is_upcoming), '
+            'past_show_count = (SELECT count(*) FROM "Show" WHERE "Show".{key} = "{table}".id AND NOT is_upcoming)'
+            .format(table=table, key=key)
+        )
+
+
+def downgrade():
+    op.drop_column('Artist', 'past_show_count')
+    op.drop_column('Artist', 'upcoming_show_count')
+    op.drop_column('Venue', 'past_show_count')
+    op.drop_column('Venue', 'upcoming_show_count')
+    op.drop_column('Show', 'is_upcoming')
@@ -0,0 +1,36 @@
+"""composite Show indexes for venue/artist time ranges
+
+Revision ID: 4e6b1a9f05d2
+Revises: d8e3f40a1c27
+Create Date: 2026-10-17 14:55:31.904126
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4e6b1a9f05d2'
+down_revision = 'd8e3f40a1c27'
+branch_labels = None
+depends_on = None
+
+
+# CREATE/DROP INDEX CONCURRENTLY cannot run inside a transaction, hence the autocommit
+# blocks; the table stays writable while the indexes build.
+
+def upgrade():
+    with op.get_context().autocommit_block():
+        op.create_index('ix_Show_venue_id_start_time', 'Show', ['venue_id', 'start_time'], unique=False,
+                        postgresql_concurrently=True)
+        op.create_index('ix_Show_artist_id_start_time', 'Show', ['artist_id', 'start_time'], unique=False,
+                        postgresql_concurrently=True)
+        op.create_index('ix_Show_start_time_upcoming', 'Show', ['start_time'], unique=False,
+                        postgresql_where=sa.text('is_upcoming'), postgresql_concurrently=True)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_Show_start_time_upcoming', table_name='Show', postgresql_concurrently=True)
+        op.drop_index('ix_Show_artist_id_start_time', table_name='Show', postgresql_concurrently=True)
+        op.drop_index('ix_Show_venue_id_start_time', table_name='Show', postgresql_concurrently=True)
@@ -0,0 +1,34 @@
+"""pg_trgm indexes for name search
+
+Revision ID: 7a4e2d91c3b8
+Revises: 3f1c9a7d2b60
+Create Date: 2026-10-17 10:02:17.530981
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7a4e2d91c3b8'
+down_revision = '3f1c9a7d2b60'
+branch_labels = None
+depends_on = None
+
+
+# CREATE/DROP INDEX CONCURRENTLY cannot run inside a transaction, hence the autocommit
+# blocks; Venue and Artist stay writable while the indexes build.
+
+def upgrade():
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    with op.get_context().autocommit_block():
+        op.create_index('ix_Venue_name_trgm', 'Venue', ['name'], unique=False, postgresql_using='gin',
+                        postgresql_ops={'name': 'gin_trgm_ops'}, postgresql_concurrently=True)
+        op.create_index('ix_Artist_name_trgm', 'Artist', ['name'], unique=False, postgresql_using='gin',
+                        postgresql_ops={'name': 'gin_trgm_ops'}, postgresql_concurrently=True)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_Artist_name_trgm', table_name='Artist', postgresql_concurrently=True)
+        op.drop_index('ix_Venue_name_trgm', table_name='Venue', postgresql_concurrently=True)
@@ -0,0 +1,26 @@
+"""GIN indexes on genres
+
+Revision ID: 9c0f5e2b7d44
+Revises: 4e6b1a9f05d2
+Create Date: 2026-10-17 15:48:12.377590
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9c0f5e2b7d44'
+down_revision = '4e6b1a9f05d2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_Venue_genres', 'Venue', ['genres'], unique=False, postgresql_using='gin')
+    op.create_index('ix_Artist_genres', 'Artist', ['genres'], unique=False, postgresql_using='gin')
+
+
+def downgrade():
+    op.drop_index('ix_Artist_genres', table_name='Artist')
+    op.drop_index('ix_Venue_genres', table_name='Venue')
@@ -0,0 +1,33 @@
+"""NOT NULL on the listing sort columns
+
+Revision ID: a61d4f0c8e27
+Revises: 9c0f5e2b7d44
+Create Date: 2026-10-17 23:20:41.518302
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a61d4f0c8e27'
+down_revision = '9c0f5e2b7d44'
+branch_labels = None
+depends_on = None
+
+# the keyset pagination of /venues and /artists seeks with row comparisons, under which a
+# NULL sort key drops its row from every page after the first; the forms already require
+# these, so only rows loaded some other way can hold a NULL, which becomes ''
+COLUMNS = [('Venue', 'name', sa.String()), ('Venue', 'city', sa.String(length=120)),
+           ('Venue', 'state', sa.String(length=120)), ('Artist', 'name', sa.String())]
+
+
+def upgrade():
+    for table, column, type_ in COLUMNS:
+        op.execute('UPDATE "%s" SET %s = \'\' WHERE %s IS NULL' % (table, column, column))
+        op.alter_column(table, column, existing_type=type_, nullable=False)
+
+
+def downgrade():
+    for table, column, type_ in reversed(COLUMNS):
+        op.alter_column(table, column, existing_type=type_, nullable=True)
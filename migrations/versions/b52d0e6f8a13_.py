@@ -0,0 +1,28 @@
+"""sort key indexes for keyset pagination
+
+Revision ID: b52d0e6f8a13
+Revises: 7a4e2d91c3b8
+Create Date: 2026-10-17 11:20:54.662310
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b52d0e6f8a13'
+down_revision = '7a4e2d91c3b8'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_Venue_state_city_name_id', 'Venue', ['state', 'city', 'name', 'id'], unique=False)
+    op.create_index('ix_Artist_name_id', 'Artist', ['name', 'id'], unique=False)
+    op.create_index('ix_Show_start_time_id', 'Show', ['start_time', 'id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_Show_start_time_id', table_name='Show')
+    op.drop_index('ix_Artist_name_id', table_name='Artist')
+    op.drop_index('ix_Venue_state_city_name_id', table_name='Venue')
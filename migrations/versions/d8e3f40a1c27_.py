@@ -0,0 +1,28 @@
+"""updated_at stamps on Venue and Artist
+
+Revision ID: d8e3f40a1c27
+Revises: b52d0e6f8a13
+Create Date: 2026-10-17 13:41:08.207745
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd8e3f40a1c27'
+down_revision = 'b52d0e6f8a13'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('Venue', sa.Column('updated_at', sa.DateTime(), nullable=False,
+                                     server_default=sa.text("(now() at time zone 'utc')")))
+    op.add_column('Artist', sa.Column('updated_at', sa.DateTime(), nullable=False,
+                                      server_default=sa.text("(now() at time zone 'utc')")))
+
+
+def downgrade():
+    op.drop_column('Artist', 'updated_at')
+    op.drop_column('Venue', 'updated_at')
@@ -1,18 +1,117 @@
 from datetime import datetime
 
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.ext.hybrid import hybrid_property
 
-db = SQLAlchemy()
+from routing import RoutingSession
 
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 
-class Venue(db.Model):
+
+class ShowsMixin(object):
+    """Upcoming/past show accessors shared by Venue and Artist.
+
+    The counts and the "has upcoming shows" flag are hybrids: on an instance they run
+    a COUNT in the database, and on the class they are correlated subqueries usable
+    in filter() and order_by().  ``_show_key`` names the Show column pointing back
+    at the model.
+    """
+    _show_key = None
+
+    @classmethod
+    def _show_fk(cls):
+        return getattr(Show, cls._show_key)
+
+    def _shows_query(self):
+        return Show.query.filter(self._show_fk() == self.id)
+
+    @classmethod
+    def with_num_upcoming_shows(cls, query):
+        """Reduce a query over the model to (id, name, num_upcoming_shows) rows, counted in
+        one aggregate over the matches instead of one COUNT per row."""
+        return query.outerjoin(Show, db.and_(cls._show_fk() == cls.id, Show.upcoming())) \
+            .group_by(cls.id) \
+            .with_entities(cls.id, cls.name, db.func.count(Show.id).label('num_upcoming_shows'))
+
+    @property
+    def upcoming_shows(self):
+        return self._shows_query().filter(Show.upcoming()).order_by(Show.start_time).all()
+
+    @property
+    def past_shows(self):
+        return self._shows_query().filter(Show.past()).order_by(Show.start_time).all()
+
+    @hybrid_property
+    def num_upcoming_shows(self):
+        return self._shows_query().filter(Show.upcoming()).count()
+
+    @num_upcoming_shows.expression
+    def num_upcoming_shows(cls):
+        return db.select(db.func.count(Show.id)) \
+            .where(cls._show_fk() == cls.id, Show.upcoming()) \
+            .correlate_except(Show).scalar_subquery()
+
+    @hybrid_property
+    def num_past_shows(self):
+        return self._shows_query().filter(Show.past()).count()
+
+    @num_past_shows.expression
+    def num_past_shows(cls):
+        return db.select(db.func.count(Show.id)) \
+            .where(cls._show_fk() == cls.id, Show.past()) \
+            .correlate_except(Show).scalar_subquery()
+
+    @hybrid_property
+    def has_upcoming_shows(self):
+        return db.session.query(
+            self._shows_query().filter(Show.upcoming()).exists()).scalar()
+
+    @has_upcoming_shows.expression
+    def has_upcoming_shows(cls):
+        return db.exists().where(cls._show_fk() == cls.id, Show.upcoming())
+
+
+class NameSearchMixin(object):
+    """Case-insensitive substring search on ``name``.
+
+    Both the ILIKE match and the ``%`` similarity operator are served by the
+    pg_trgm GIN index on ``name``; ranked searches order by similarity() so the
+    closest names come first.
+
+    A short or common term matches a large share of the table, so with ``limit`` only
+    the first ``limit`` matches are kept, picked in a subquery: the query returned can
+    still be joined and grouped (see ``with_num_upcoming_shows``) over those rows alone.
+    """
+
+    @classmethod
+    def search_by_name(cls, term, ranked=False, limit=None):
+        match = cls.name.ilike('%' + term + '%')
+        if ranked:
+            match = db.or_(match, cls.name.op('%')(term))
+            order = [db.func.similarity(cls.name, term).desc(), cls.name]
+        else:
+            order = [cls.name]
+        if limit is None:
+            return cls.query.filter(match).order_by(*order)
+        first = db.select(cls.id).where(match).order_by(*order, cls.id).limit(limit)
+        return cls.query.filter(cls.id.in_(first)).order_by(*order)
+
+
+class Venue(NameSearchMixin, ShowsMixin, db.Model):
     __tablename__ = 'Venue'
+    __table_args__ = (
+        db.Index('ix_Venue_name_trgm', 'name', postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'}),
+        db.Index('ix_Venue_genres', 'genres', postgresql_using='gin'),
+        db.Index('ix_Venue_state_city_name_id', 'state', 'city', 'name', 'id'),
+    )
+    _show_key = 'venue_id'
 
     id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String)
-    genres = db.Column(db.ARRAY(db.String(120)))
-    city = db.Column(db.String(120))
-    state = db.Column(db.String(120))
+    name = db.Column(db.String, nullable=False)
+    genres = db.Column(ARRAY(db.String(120)))
+    city = db.Column(db.String(120), nullable=False)
+    state = db.Column(db.String(120), nullable=False)
     address = db.Column(db.String(120))
     phone = db.Column(db.String(120))
     website = db.Column(db.String(120))
@@ -21,73 +120,165 @@ class Venue(db.Model):
     image_link = db.Column(db.String(500))
     facebook_link = db.Column(db.String(120))
     shows = db.relationship('Show', backref='Venue', lazy=True)
-
-    @property
-    def upcoming_shows(self):
-        upcoming_shows = [show for show in self.shows if
-                          show.start_time > datetime.now()]
-        return upcoming_shows
-
-    @property
-    def num_upcoming_shows(self):
-        return len(self.upcoming_shows)
-
-    @property
-    def past_shows(self):
-        past_shows = [show for show in self.shows if show.start_time < datetime.now()]
-        return past_shows
-
-    @property
-    def num_past_shows(self):
-        return len(self.past_shows)
+    upcoming_show_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    past_show_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    # bumped by every write that changes the detail page, including show counter updates
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow,
+                           server_default=db.text("(now() at time zone 'utc')"))
 
     # implement any missing fields, as a database migration using Flask-Migrate     √
 
 
-class Artist(db.Model):
+class Artist(NameSearchMixin, ShowsMixin, db.Model):
     __tablename__ = 'Artist'
+    __table_args__ = (
+        db.Index('ix_Artist_name_trgm', 'name', postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'}),
+        db.Index('ix_Artist_genres', 'genres', postgresql_using='gin'),
+        db.Index('ix_Artist_name_id', 'name', 'id'),
+    )
+    _show_key = 'artist_id'
 
     id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String)
+    name = db.Column(db.String, nullable=False)
     city = db.Column(db.String(120))
     state = db.Column(db.String(120))
     phone = db.Column(db.String(120))
-    genres = db.Column(db.ARRAY(db.String(120)))
+    genres = db.Column(ARRAY(db.String(120)))
     website = db.Column(db.String(120))
     seeking_venue = db.Column(db.Boolean, default=False)
     seeking_description = db.Column(db.String(500))
     image_link = db.Column(db.String(500))
     facebook_link = db.Column(db.String(120))
     shows = db.relationship('Show', backref='Artist', lazy=True)
-
-    @property
-    def upcoming_shows(self):
-        upcoming_shows = [show for show in self.shows if show.start_time > datetime.now()]
-        return upcoming_shows
-
-    @property
-    def num_upcoming_shows(self):
-        return len(self.upcoming_shows)
-
-    @property
-    def past_shows(self):
-        past_shows = [show for show in self.shows if show.start_time < datetime.now()]
-
-        return past_shows
-
-    @property
-    def num_past_shows(self):
-        return len(self.past_shows)
+    upcoming_show_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    past_show_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    # bumped by every write that changes the detail page, including show counter updates
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow,
+                           server_default=db.text("(now() at time zone 'utc')"))
 
 
 class Show(db.Model):
     __tablename__ = 'Show'
+    __table_args__ = (
+        db.Index('ix_Show_start_time_id', 'start_time', 'id'),
+        db.Index('ix_Show_venue_id_start_time', 'venue_id', 'start_time'),
+        db.Index('ix_Show_artist_id_start_time', 'artist_id', 'start_time'),
+        db.Index('ix_Show_start_time_upcoming', 'start_time', postgresql_where=db.text('is_upcoming')),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     start_time = db.Column(db.DateTime, nullable=False)
     artist_id = db.Column(db.Integer, db.ForeignKey('Artist.id'), nullable=False)
     venue_id = db.Column(db.Integer, db.ForeignKey('Venue.id'), nullable=False)
+    # which counter the show is currently tallied in; flipped by rollover_show_counters()
+    is_upcoming = db.Column(db.Boolean, nullable=False, default=False, server_default='false')
 
     #  implement any missing fields, as a database migration using Flask-Migrate √
 
+    # The past/upcoming split is a range on start_time, so together with an equality on
+    # venue_id or artist_id it is a single scan of the matching composite index.
+    @staticmethod
+    def upcoming(now=None):
+        return Show.start_time > (now or datetime.now())
+
+    @staticmethod
+    def past(now=None):
+        return Show.start_time <= (now or datetime.now())
+
 #  Implement Show and Artist models, and complete all model relationships and properties, as a database migration.  √
+
+
+#  Show counters
+#  ----------------------------------------------------------------
+#  Venue/Artist.upcoming_show_count and past_show_count are maintained here, inside the
+#  caller's transaction, so listings can read them as plain columns.
+
+def _adjust_show_counters(model, deltas):
+    """Apply {id: (upcoming delta, past delta)} to ``model``'s counters in one executemany."""
+    if not deltas:
+        return
+    table = model.__table__
+    db.session.execute(
+        table.update()
+        .where(table.c.id == db.bindparam('_id'))
+        .values(upcoming_show_count=table.c.upcoming_show_count + db.bindparam('_upcoming'),
+                past_show_count=table.c.past_show_count + db.bindparam('_past')),
+        [{'_id': key, '_upcoming': upcoming, '_past': past} for key, (upcoming, past) in deltas.items()]
+    )
+
+
+def count_new_show(show):
+    """Tally a show that is being added to the session; the caller commits."""
+    show.is_upcoming = show.start_time > datetime.now()
+    delta = (1, 0) if show.is_upcoming else (0, 1)
+    _adjust_show_counters(Venue, {show.venue_id: delta})
+    _adjust_show_counters(Artist, {show.artist_id: delta})
+
+
+def delete_shows_of(instance):
+    """Delete every show of a Venue or Artist, taking them off the other side's counters."""
+    other, other_key = (Artist, 'artist_id') if isinstance(instance, Venue) else (Venue, 'venue_id')
+    shows = Show.query.filter(instance._show_fk() == instance.id)
+
+    deltas = {}
+    for key, is_upcoming in shows.with_entities(getattr(Show, other_key), Show.is_upcoming):
+        upcoming, past = deltas.get(key, (0, 0))
+        deltas[key] = (upcoming - 1, past) if is_upcoming else (upcoming, past - 1)
+    _adjust_show_counters(other, deltas)
+    shows.delete(synchronize_session=False)
+
+
+def touch_shows_of(instance):
+    """Bump updated_at on the other side of every show of a Venue or Artist, whose pages
+    display the instance's name and image."""
+    other, other_key = (Artist, 'artist_id') if isinstance(instance, Venue) else (Venue, 'venue_id')
+    ids = db.session.query(getattr(Show, other_key)).filter(instance._show_fk() == instance.id)
+    other.query.filter(other.id.in_(ids)).update({other.updated_at: datetime.utcnow()}, synchronize_session=False)
+
+
+def rollover_show_counters(now=None):
+    """Move shows whose start_time has passed from the upcoming to the past counters.
+
+    Returns the number of shows rolled over.
+    """
+    now = now or datetime.now()
+    table = Show.__table__
+    rows = db.session.execute(
+        table.update()
+        .where(table.c.is_upcoming, Show.past(now))
+        .values(is_upcoming=False)
+        .returning(table.c.venue_id, table.c.artist_id)
+    ).fetchall()
+    for model, index in ((Venue, 0), (Artist, 1)):
+        deltas = {}
+        for row in rows:
+            upcoming, past = deltas.get(row[index], (0, 0))
+            deltas[row[index]] = (upcoming - 1, past + 1)
+        _adjust_show_counters(model, deltas)
+    db.session.commit()
+    return len(rows)
+
+
+def check_show_counters(repair=False):
+    """Compare the stored counters with the Show table.
+
+    Returns {model name: [drifted ids]}; with ``repair`` the drifted rows are rewritten
+    from the Show table in one UPDATE per model.
+    """
+    drift = {}
+    for model in (Venue, Artist):
+        fk = model._show_fk()
+        actual_upcoming = db.select(db.func.count(Show.id)) \
+            .where(fk == model.id, Show.is_upcoming).correlate_except(Show).scalar_subquery()
+        actual_past = db.select(db.func.count(Show.id)) \
+            .where(fk == model.id, db.not_(Show.is_upcoming)).correlate_except(Show).scalar_subquery()
+        drifted = db.or_(model.upcoming_show_count != actual_upcoming, model.past_show_count != actual_past)
+
+        drift[model.__name__] = [row.id for row in model.query.with_entities(model.id).filter(drifted)]
+        if repair and drift[model.__name__]:
+            model.query.filter(model.id.in_(drift[model.__name__])).update(
+                {model.upcoming_show_count: actual_upcoming, model.past_show_count: actual_past},
+                synchronize_session=False)
+    if repair:
+        db.session.commit()
+    return drift
@@ -0,0 +1,98 @@
+import base64
+import json
+from collections import namedtuple
+from datetime import datetime
+
+from flask import request, url_for, abort
+from sqlalchemy import tuple_
+
+Page = namedtuple('Page', ['items', 'prev_url', 'next_url'])
+
+
+def encode_cursor(values):
+    def default(value):
+        if isinstance(value, datetime):
+            return {'dt': value.isoformat()}
+        raise TypeError(repr(value))
+
+    return base64.urlsafe_b64encode(json.dumps(values, default=default).encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    def object_hook(value):
+        if 'dt' in value:
+            return datetime.fromisoformat(value['dt'])
+        return value
+
+    try:
+        return json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)), object_hook=object_hook)
+    except (ValueError, TypeError):
+        # TypeError: a forged {"dt": ...} holding anything but a string
+        abort(400)
+
+
+def _seek_values(cursor, columns):
+    # a cursor decoding to anything but one value of the right type per sort column is a
+    # bad request, not a TypeError or a database error
+    values = decode_cursor(cursor)
+    if not isinstance(values, list) or len(values) != len(columns) or not all(
+            isinstance(value, column.type.python_type) and not isinstance(value, bool)
+            for value, column in zip(values, columns)):
+        abort(400)
+    return values
+
+
+def _page_url(**cursor):
+    # every value of a repeated argument (e.g. ?genre=Jazz&genre=Blues), so the next page
+    # applies the same filter
+    args = {key: values for key, values in request.args.lists() if key not in ('after', 'before')}
+    args.update(cursor)
+    return url_for(request.endpoint, **dict(request.view_args or {}, **args))
+
+
+def keyset_paginate(query, keys, per_page):
+    """Return one Page of ``query`` ordered by ``keys``, a list of (column, row attribute) pairs
+    that together are unique, e.g. [(Show.start_time, 'start_time'), (Show.id, 'id')].
+
+    The position comes from the ``after``/``before`` request arguments, which hold the
+    encoded sort key of the last/first row of the neighbouring page.  Each page is a range
+    scan seeking from that key with ``LIMIT per_page + 1``, so deep pages cost the same as
+    the first one.
+    """
+    return keyset_page(keyset_query(query, keys, per_page).all(), keys, per_page)
+
+
+def keyset_query(query, keys, per_page):
+    """The seek, order and limit of keyset_paginate() applied to a Query or select(), for
+    callers that run the statement themselves (the async views) and pass the rows to
+    keyset_page()."""
+    columns = [column for column, _ in keys]
+    after, before = request.args.get('after'), request.args.get('before')
+
+    if before:
+        query = query.filter(tuple_(*columns) < tuple_(*_seek_values(before, columns))) \
+            .order_by(*[column.desc() for column in columns])
+    else:
+        if after:
+            query = query.filter(tuple_(*columns) > tuple_(*_seek_values(after, columns)))
+        query = query.order_by(*columns)
+    return query.limit(per_page + 1)
+
+
+def keyset_page(rows, keys, per_page):
+    after, before = request.args.get('after'), request.args.get('before')
+    has_more = len(rows) > per_page
+    rows = list(rows[:per_page])
+    if before:
+        rows.reverse()
+    if not rows:
+        return Page(rows, None, None)
+
+    def cursor_of(row):
+        return encode_cursor([getattr(row, name) for _, name in keys])
+
+    has_prev = has_more if before else bool(after)
+    has_next = has_more if not before else True
+    return Page(rows,
+                _page_url(before=cursor_of(rows[0])) if has_prev else None,
+                _page_url(after=cursor_of(rows[-1])) if has_next else None)
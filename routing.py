@@ -0,0 +1,121 @@
+import random
+import threading
+import time
+from functools import wraps
+
+from flask import g, session, current_app, has_app_context
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event, text
+
+# the primary's position, read just before the replica is probed.  Both probes run within
+# requests but are not the page's own statements: RequestTimer leaves them uncounted.
+PRIMARY_LSN_QUERY = text('SELECT pg_current_wal_lsn()::text').execution_options(uncounted=True)
+# 0 when the replica has replayed everything the primary had written when it was asked,
+# otherwise seconds since the last replayed transaction; NULL (unusable) when no WAL
+# receiver is running, i.e. the replica is detached from the primary.  A server that is
+# not in recovery counts as up to date.
+LAG_QUERY = text(
+    'SELECT CASE WHEN NOT pg_is_in_recovery() THEN 0 '
+    'WHEN NOT EXISTS (SELECT 1 FROM pg_stat_wal_receiver) THEN NULL '
+    'WHEN pg_last_wal_replay_lsn() >= CAST(:primary_lsn AS pg_lsn) THEN 0 '
+    'ELSE extract(epoch FROM now() - pg_last_xact_replay_timestamp()) END'
+).execution_options(uncounted=True)
+
+
+class RoutingSession(Session):
+    """Session that sends reads to the replica picked for the request (``g.db_replica``)
+    and everything else, including flushes, to the primary."""
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        replica = g.get('db_replica') if has_app_context() else None
+        if replica is not None and not self._flushing:
+            return current_app.extensions['sqlalchemy'].engines[replica]
+        return super(RoutingSession, self).get_bind(mapper=mapper, clause=clause, **kwargs)
+
+
+@event.listens_for(RoutingSession, 'after_flush')
+def _remember_write(db_session, flush_context):
+    if has_app_context():
+        g.db_wrote = True
+
+
+class ReplicaRouter(object):
+    """Chooses a replica for read-only views and keeps a client on the primary for
+    READ_YOUR_WRITES_SECONDS after it wrote, so the redirect after a form submission
+    shows its own change.
+
+    Replicas are the SQLALCHEMY_BINDS keys starting with ``replica``.  Their lag is
+    probed at most every REPLICA_LAG_CHECK_INTERVAL seconds; one lagging more than
+    REPLICA_MAX_LAG seconds, or detached from the primary, is skipped, and with none
+    available reads stay on the primary.  Pages read from a replica are not stored in the
+    response cache.
+    """
+
+    def __init__(self, app=None):
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        max_lag = app.config.get('REPLICA_MAX_LAG', 5)
+        app.extensions['replica_router'] = {
+            'replicas': sorted(key for key in app.config.get('SQLALCHEMY_BINDS') or {} if key.startswith('replica')),
+            'max_lag': max_lag,
+            'check_interval': app.config.get('REPLICA_LAG_CHECK_INTERVAL', 1),
+            'sticky_seconds': app.config.get('READ_YOUR_WRITES_SECONDS', max_lag),
+            'lag': {},  # replica -> (monotonic time checked, lag)
+        }
+        app.after_request(self._stick_after_write)
+
+    @property
+    def _state(self):
+        return current_app.extensions['replica_router']
+
+    def _stick_after_write(self, response):
+        if g.get('db_wrote') and self._state['replicas']:
+            session['primary_until'] = time.time() + self._state['sticky_seconds']
+        return response
+
+    def lag(self, replica):
+        state = self._state
+        now = time.monotonic()
+        with self._lock:
+            checked, lag = state['lag'].get(replica, (None, None))
+        if checked is None or now - checked > state['check_interval']:
+            try:
+                engines = current_app.extensions['sqlalchemy'].engines
+                with engines[None].connect() as connection:
+                    primary_lsn = connection.execute(PRIMARY_LSN_QUERY).scalar()
+                with engines[replica].connect() as connection:
+                    lag = connection.execute(LAG_QUERY, {'primary_lsn': primary_lsn}).scalar()
+                    lag = float(lag) if lag is not None else None
+            except Exception:
+                current_app.logger.exception('replica %s lag check failed', replica)
+                lag = None
+            with self._lock:
+                state['lag'][replica] = (now, lag)
+        return lag
+
+    def choose(self):
+        replicas = self._state['replicas']
+        if not replicas or session.get('primary_until', 0) > time.time():
+            return None, None
+        for replica in random.sample(replicas, len(replicas)):
+            lag = self.lag(replica)
+            if lag is not None and lag <= self._state['max_lag']:
+                return replica, lag
+        return None, None
+
+    def reads(self, view):
+        """Run ``view`` against a replica when one is healthy."""
+
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            g.db_replica, lag = self.choose()
+            # even a replica reporting no lag may not have replayed a write committed since
+            # its last probe, while the write's invalidation is already in effect: only
+            # pages read from the primary are stored in the response cache
+            g.skip_response_cache = g.db_replica is not None
+            return view(*args, **kwargs)
+
+        return wrapper
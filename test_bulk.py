@@ -0,0 +1,146 @@
+"""Catalog import and export tests.
+
+The row validation tests need no database.  The round trip through export_catalog() and
+import_catalog() needs an empty PostgreSQL database it is free to drop and recreate:
+
+    FYYUR_TEST_DATABASE_URL=postgresql://localhost/fyyur_test python test_bulk.py -v
+"""
+import os
+import tempfile
+import unittest
+from datetime import datetime
+
+from app import create_app
+from bulk import CATALOG, validate, read_rows, import_catalog, export_catalog
+from models import db, Venue, Artist, Show
+
+TEST_DATABASE_URL = os.environ.get('FYYUR_TEST_DATABASE_URL')
+
+app = create_app(dict(
+    TESTING=True, WTF_CSRF_ENABLED=False, CACHE_TYPE='null', SQLALCHEMY_BINDS={},
+    **({'SQLALCHEMY_DATABASE_URI': TEST_DATABASE_URL} if TEST_DATABASE_URL else {})))
+
+VENUE_ROW = {'id': '7', 'name': 'The Blue Room', 'city': 'Springfield', 'state': 'NY', 'address': '1 Main St',
+             'phone': '555-555-5555', 'genres': ['Jazz', 'Blues'], 'website': 'http://example.com',
+             'facebook_link': 'http://facebook.com/blueroom', 'image_link': '', 'seeking_talent': 'false',
+             'seeking_description': ''}
+SHOW_ROW = {'id': '', 'venue_id': '7', 'artist_id': '9', 'start_time': '2026-05-01 20:30:00'}
+
+
+def _validate(kind, row):
+    _, form_class, columns = CATALOG[kind]
+    return validate(form_class, columns, row)
+
+
+class ValidateTest(unittest.TestCase):
+
+    def setUp(self):
+        self.context = app.app_context()
+        self.context.push()
+
+    def tearDown(self):
+        self.context.pop()
+
+    def test_valid_venue(self):
+        values, errors = _validate('venues', VENUE_ROW)
+        self.assertIsNone(errors)
+        self.assertEqual(values['id'], 7)
+        self.assertEqual(values['genres'], ['Jazz', 'Blues'])
+        self.assertIs(values['seeking_talent'], False)
+
+    def test_valid_show(self):
+        values, errors = _validate('shows', SHOW_ROW)
+        self.assertIsNone(errors)
+        self.assertEqual(values, {'id': None, 'venue_id': 7, 'artist_id': 9,
+                                  'start_time': datetime(2026, 5, 1, 20, 30)})
+
+    def test_form_errors(self):
+        _, errors = _validate('venues', dict(VENUE_ROW, state='XX', genres=['Polka']))
+        self.assertEqual(set(errors), {'state', 'genres'})
+
+    def test_missing_required_fields(self):
+        # ShowForm's start_time has a default, which must not stand in for a missing value
+        for row, column in ((dict(VENUE_ROW, name=''), 'name'), (dict(VENUE_ROW, city=None), 'city')):
+            with self.subTest(column=column):
+                _, errors = _validate('venues', row)
+                self.assertIn(column, errors)
+        row = dict(SHOW_ROW)
+        del row['start_time']
+        _, errors = _validate('shows', row)
+        self.assertEqual(set(errors), {'start_time'})
+
+    def test_bad_ids_are_reported_under_their_column(self):
+        for column in ('id', 'venue_id', 'artist_id'):
+            with self.subTest(column=column):
+                values, errors = _validate('shows', dict(SHOW_ROW, **{column: 'seven'}))
+                self.assertIsNone(values)
+                self.assertEqual(set(errors), {column})
+
+
+
+@unittest.skipUnless(TEST_DATABASE_URL, 'set FYYUR_TEST_DATABASE_URL to an empty, disposable database')
+class RoundTripTest(unittest.TestCase):
+
+    def setUp(self):
+        self.context = app.app_context()
+        self.context.push()
+        for table in db.metadata.tables.values():
+            for index in list(table.indexes):
+                if index.name.endswith('_trgm'):
+                    table.indexes.discard(index)
+        db.drop_all()
+        db.create_all()
+        venue = Venue(name='The Blue Room', city='Springfield', state='NY', address='1 Main St',
+                      phone='555-555-5555', genres=['Jazz', 'Blues'], website='http://example.com',
+                      facebook_link='http://facebook.com/blueroom', image_link='http://example.com/room.png',
+                      seeking_talent=True, seeking_description='Trios')
+        artist = Artist(name='The Quiet Ones', city='Springfield', state='NY', phone='555-555-5555',
+                        genres=['Jazz'], website='http://example.com', facebook_link='http://facebook.com/quiet',
+                        image_link='http://example.com/quiet.png', seeking_venue=False, seeking_description='')
+        db.session.add_all([venue, artist])
+        db.session.flush()
+        # microseconds, as a show written by anything but the create page may have
+        db.session.add(Show(venue_id=venue.id, artist_id=artist.id,
+                            start_time=datetime(2026, 5, 1, 20, 30, 15, 250000)))
+        db.session.commit()
+        self.original = self.catalog()
+
+    def tearDown(self):
+        db.session.remove()
+        self.context.pop()
+
+    def catalog(self):
+        return {kind: [{column: getattr(row, column) for column in ['id'] + columns}
+                       for row in model.query.order_by(model.id)]
+                for kind, (model, _, columns) in CATALOG.items()}
+
+    def test_export_reimports(self):
+        for export_fmt, import_fmt in (('csv', 'csv'), ('ndjson', 'jsonl')):
+            with self.subTest(fmt=export_fmt), tempfile.TemporaryDirectory() as directory:
+                paths = {}
+                for kind in CATALOG:
+                    paths[kind] = os.path.join(directory, kind)
+                    with open(paths[kind], 'wb') as f:
+                        for chunk in export_catalog(kind, export_fmt):
+                            f.write(chunk)
+                for model in (Show, Venue, Artist):
+                    model.query.delete()
+                db.session.commit()
+
+                for kind in ('venues', 'artists', 'shows'):
+                    invalid = []
+                    stats = import_catalog(kind, read_rows(paths[kind], import_fmt),
+                                           on_invalid=lambda line, errors: invalid.append((line, errors)))
+                    self.assertEqual(invalid, [], kind)
+                    self.assertEqual(stats['upserted'], len(self.original[kind]), kind)
+
+                db.session.expire_all()
+                restored = self.catalog()
+                # to the second: the form import goes through keeps no more
+                self.assertEqual(restored['shows'][0]['start_time'], datetime(2026, 5, 1, 20, 30, 15))
+                self.original['shows'][0]['start_time'] = restored['shows'][0]['start_time']
+                self.assertEqual(restored, self.original)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,126 @@
+"""Response cache and conditional GET tests, on a bare Flask app; no database needed.
+
+    python test_cache.py -v
+"""
+import unittest
+from datetime import datetime, timedelta
+
+from flask import Flask, request
+from werkzeug.http import http_date
+
+from cache import LRUCache, ResponseCache, conditional_get
+
+UPDATED_AT = datetime(2026, 5, 1, 20, 30, 15, 250000)
+
+
+def _app(stamps, calls, cache_type='null'):
+    """An app with one entity page, /things/<id>, changed at ``stamps[id]`` (missing ids
+    have no timestamp); every run of the view is appended to ``calls``."""
+    app = Flask(__name__)
+    app.config.update(SECRET_KEY='test', CACHE_TYPE=cache_type)
+    response_cache = ResponseCache(app)
+
+    @app.route('/things/<int:thing_id>')
+    @conditional_get(lambda thing_id: stamps.get(thing_id), lambda: request.args.get('fields', ''))
+    @response_cache.cached('thing:{thing_id}')
+    def thing(thing_id):
+        calls.append(thing_id)
+        return 'thing %d, %s' % (thing_id, request.args.get('fields', 'all'))
+
+    return app, response_cache
+
+
+class ConditionalGetTest(unittest.TestCase):
+
+    def setUp(self):
+        self.stamps, self.calls = {1: UPDATED_AT}, []
+        self.app, _ = _app(self.stamps, self.calls)
+        self.client = self.app.test_client()
+
+    def test_fresh_response_carries_validators(self):
+        response = self.client.get('/things/1')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.headers['ETag'])
+        self.assertEqual(response.headers['Last-Modified'], http_date(UPDATED_AT.replace(microsecond=0)))
+        self.assertIn('no-cache', response.headers['Cache-Control'])
+
+    def test_matching_etag_is_304_without_running_the_view(self):
+        etag = self.client.get('/things/1').headers['ETag']
+        response = self.client.get('/things/1', headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.headers['ETag'], etag)
+        self.assertEqual(self.calls, [1])
+
+    def test_write_within_the_same_second_changes_the_etag(self):
+        etag = self.client.get('/things/1').headers['ETag']
+        self.stamps[1] = UPDATED_AT + timedelta(microseconds=1)
+        response = self.client.get('/things/1', headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.headers['ETag'], etag)
+
+    def test_if_modified_since(self):
+        response = self.client.get('/things/1', headers={'If-Modified-Since': http_date(UPDATED_AT)})
+        self.assertEqual(response.status_code, 304)
+        earlier = http_date(UPDATED_AT - timedelta(seconds=1))
+        response = self.client.get('/things/1', headers={'If-Modified-Since': earlier})
+        self.assertEqual(response.status_code, 200)
+
+    def test_each_variant_has_its_own_etag(self):
+        etag = self.client.get('/things/1?fields=name').headers['ETag']
+        response = self.client.get('/things/1?fields=name,shows', headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.headers['ETag'], etag)
+        self.assertNotEqual(self.client.get('/things/1').headers['ETag'], etag)
+
+    def test_no_timestamp_skips_validation(self):
+        response = self.client.get('/things/2', headers={'If-Modified-Since': http_date(UPDATED_AT)})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('ETag', response.headers)
+
+
+class ResponseCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.stamps, self.calls = {1: UPDATED_AT}, []
+        self.app, self.response_cache = _app(self.stamps, self.calls, cache_type='simple')
+        self.client = self.app.test_client()
+
+    def test_hit_until_invalidated(self):
+        for _ in range(2):
+            self.assertEqual(self.client.get('/things/1').data, b'thing 1, all')
+        self.assertEqual(self.calls, [1])
+        with self.app.app_context():
+            self.response_cache.invalidate('thing:2')
+        self.client.get('/things/1')
+        self.assertEqual(self.calls, [1])
+        with self.app.app_context():
+            self.response_cache.invalidate('thing:1')
+        self.client.get('/things/1')
+        self.assertEqual(self.calls, [1, 1])
+
+    def test_body_is_keyed_by_etag(self):
+        # a write the cache was not told about (e.g. made in another process) still shows
+        self.client.get('/things/1')
+        self.stamps[1] = UPDATED_AT + timedelta(seconds=1)
+        self.client.get('/things/1')
+        self.assertEqual(self.calls, [1, 1])
+
+
+class LRUCacheTest(unittest.TestCase):
+
+    def test_evicts_least_recently_used(self):
+        cache = LRUCache(max_entries=2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get_many(['a'])
+        cache.set('c', 3)
+        self.assertEqual(cache.get_many(['a', 'b', 'c']), [1, None, 3])
+
+    def test_entries_expire(self):
+        cache = LRUCache(ttl=-1)
+        cache.set('a', 1)
+        self.assertEqual(cache.get_many(['a']), [None])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,53 @@
+"""Cursor tests for keyset pagination; no database needed.
+
+    python test_pagination.py -v
+"""
+import base64
+import json
+import unittest
+from datetime import datetime
+
+from werkzeug.exceptions import BadRequest
+
+from models import Show
+from pagination import encode_cursor, decode_cursor, _seek_values
+
+
+def forge(value):
+    """A cursor encoding ``value`` as it is, the way a client could build one."""
+    return base64.urlsafe_b64encode(json.dumps(value).encode()).decode().rstrip('=')
+
+
+class DecodeCursorTest(unittest.TestCase):
+
+    def test_round_trip(self):
+        values = [datetime(2026, 5, 1, 20, 30, 0, 125), 42]
+        self.assertEqual(decode_cursor(encode_cursor(values)), values)
+
+    def test_malformed_cursor_is_bad_request(self):
+        for cursor in ('not base64!', forge('x')[:-2], base64.urlsafe_b64encode(b'\xff\xfe').decode()):
+            with self.subTest(cursor=cursor), self.assertRaises(BadRequest):
+                decode_cursor(cursor)
+
+    def test_forged_datetime_is_bad_request(self):
+        for value in ([{'dt': 1}, 1], {'dt': None}, [{'dt': ['2026-05-01']}, 1], [{'dt': 'yesterday'}, 1]):
+            with self.subTest(value=value), self.assertRaises(BadRequest):
+                decode_cursor(forge(value))
+
+
+class SeekValuesTest(unittest.TestCase):
+    columns = [Show.start_time, Show.id]
+
+    def test_one_value_per_column(self):
+        values = [datetime(2026, 5, 1, 20, 30), 7]
+        self.assertEqual(_seek_values(encode_cursor(values), self.columns), values)
+
+    def test_wrong_shape_or_type_is_bad_request(self):
+        for value in (7, [], [7], [{'dt': '2026-05-01T20:30:00'}, 7, 8], [{'dt': '2026-05-01T20:30:00'}, '7'],
+                      [{'dt': '2026-05-01T20:30:00'}, True], ['2026-05-01T20:30:00', 7], [None, 7]):
+            with self.subTest(value=value), self.assertRaises(BadRequest):
+                _seek_values(forge(value), self.columns)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,367 @@
+"""Query-count regression tests.
+
+Every route in app.py is requested and the SQL statements it issues are counted.  Each
+count must stay within the route's bound in QUERY_BOUNDS, and the pages that list or
+join rows are requested twice, covering one row and many rows, so a loop issuing a
+query per venue, artist or show (N+1) fails even while it is still under the bound.
+
+The tests need an empty PostgreSQL database they are free to drop and recreate:
+
+    FYYUR_TEST_DATABASE_URL=postgresql://localhost/fyyur_test python test_queries.py -v
+"""
+import logging
+import os
+import unittest
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+from sqlalchemy import event, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import DBAPIError
+
+from app import create_app
+from models import db, Venue, Artist, Show, check_show_counters
+from pagination import encode_cursor
+
+TEST_DATABASE_URL = os.environ.get('FYYUR_TEST_DATABASE_URL')
+PAGE_SIZE = 20
+CROWD = 30  # venues and artists in the busy city, and shows at the busiest venue
+
+# no response cache or replicas: every request must reach the primary
+app = create_app(dict(
+    TESTING=True, WTF_CSRF_ENABLED=False, PAGE_SIZE=PAGE_SIZE, CACHE_TYPE='null', SQLALCHEMY_BINDS={},
+    **({'SQLALCHEMY_DATABASE_URI': TEST_DATABASE_URL} if TEST_DATABASE_URL else {})))
+
+# endpoint -> most statements one request may issue
+QUERY_BOUNDS = {
+    'fyyur.index': 0,
+    'fyyur.venues': 1,
+    'fyyur.search_venues': 1,
+    'fyyur.show_venue': 3,
+    'fyyur.create_venue_form': 0,
+    'fyyur.create_venue_submission': 1,
+    'fyyur.delete_venue': 7,
+    'fyyur.artists': 1,
+    'fyyur.search_artists': 1,
+    'fyyur.show_artist': 3,
+    'fyyur.edit_artist': 1,
+    'fyyur.edit_artist_submission': 5,
+    'fyyur.edit_venue': 1,
+    'fyyur.edit_venue_submission': 5,
+    'fyyur.create_artist_form': 0,
+    'fyyur.create_artist_submission': 1,
+    'fyyur.shows': 1,
+    'fyyur.create_shows': 0,
+    'fyyur.create_show_submission': 3,
+    'fyyur.api_venues': 1,
+    'fyyur.api_venue': 3,
+    'fyyur.api_artists': 1,
+    'fyyur.api_artist': 3,
+    'fyyur.api_shows': 1,
+    'fyyur.api_show': 1,
+    'fyyur.metrics_endpoint': 0,
+    'fyyur.export': 1,
+}
+
+VENUE_FORM = {'name': 'New Venue', 'city': 'Elsewhere', 'state': 'NY', 'address': '1 Main St',
+              'phone': '555-555-5555', 'genres': ['Jazz'], 'website': 'http://example.com',
+              'facebook_link': 'http://facebook.com/venue'}
+ARTIST_FORM = {'name': 'New Artist', 'city': 'Elsewhere', 'state': 'NY', 'phone': '555-555-5555',
+               'genres': ['Jazz'], 'website': 'http://example.com', 'facebook_link': 'http://facebook.com/artist'}
+
+
+@contextmanager
+def count_queries():
+    statements = []
+
+    def record(connection, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(Engine, 'before_cursor_execute', record)
+    try:
+        yield statements
+    finally:
+        event.remove(Engine, 'before_cursor_execute', record)
+
+
+def _create_schema():
+    try:
+        db.session.execute(text('CREATE EXTENSION IF NOT EXISTS pg_trgm'))
+        db.session.commit()
+    except DBAPIError:
+        db.session.rollback()
+        # no pg_trgm on this server: leave out the trigram indexes and search by substring
+        for table in db.metadata.tables.values():
+            for index in list(table.indexes):
+                if index.name.endswith('_trgm'):
+                    table.indexes.discard(index)
+        app.config['SEARCH_MODE'] = 'substring'
+    db.drop_all()
+    db.create_all()
+
+
+def _seed():
+    """A quiet city with one venue and one artist sharing one show, a busy city with
+    CROWD venues and artists, and two venues to delete, one with a single show and one
+    with CROWD of them."""
+    now = datetime.now()
+
+    def venue(name, city):
+        return Venue(name=name, city=city, state='NY', address='1 Main St', phone='555-555-5555',
+                     genres=['Jazz', 'Blues'], image_link='http://example.com/venue.png')
+
+    def artist(name, city):
+        return Artist(name=name, city=city, state='NY', phone='555-555-5555',
+                      genres=['Jazz'], image_link='http://example.com/artist.png')
+
+    quiet_venue, quiet_artist = venue('Lone Venue', 'Quiet'), artist('Lone Artist', 'Quiet')
+    busy_venues = [venue('Busy Venue %02d' % i, 'Busy') for i in range(CROWD)]
+    busy_artists = [artist('Busy Artist %02d' % i, 'Busy') for i in range(CROWD)]
+    doomed_small, doomed_big = venue('Doomed Small', 'Gone'), venue('Doomed Big', 'Gone')
+    db.session.add_all([quiet_venue, quiet_artist, doomed_small, doomed_big] + busy_venues + busy_artists)
+    db.session.flush()
+
+    def show(venue, artist, days):
+        start_time = now + timedelta(days=days)
+        return Show(venue_id=venue.id, artist_id=artist.id, start_time=start_time, is_upcoming=start_time > now)
+
+    quiet_show = show(quiet_venue, quiet_artist, -400)
+    shows = [quiet_show]
+    # the busiest venue and artist: half of their shows past, half upcoming
+    shows += [show(busy_venues[0], busy_artists[i], i - CROWD // 2) for i in range(CROWD)]
+    shows += [show(busy_venues[i], busy_artists[0], CROWD + i) for i in range(1, CROWD)]
+    shows += [show(doomed_small, busy_artists[1], 7)]
+    shows += [show(doomed_big, busy_artists[i], 8 + i) for i in range(CROWD)]
+    db.session.add_all(shows)
+    db.session.commit()
+    check_show_counters(repair=True)
+
+    return {
+        'quiet_venue': quiet_venue.id,
+        'quiet_artist': quiet_artist.id,
+        'quiet_show': quiet_show.id,
+        'busy_venue': busy_venues[0].id,
+        'busy_artist': busy_artists[0].id,
+        'doomed_small': doomed_small.id,
+        'doomed_big': doomed_big.id,
+    }
+
+
+@unittest.skipUnless(TEST_DATABASE_URL, 'set FYYUR_TEST_DATABASE_URL to an empty, disposable database')
+class QueryCountTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        # RequestTimer logs a line per request; keep its warnings only
+        app.logger.setLevel(logging.WARNING)
+        with app.app_context():
+            _create_schema()
+            cls.ids = _seed()
+            # the sort key of the second show overall: paging back from it leaves a single row
+            second = db.session.query(Show.start_time, Show.id).order_by(Show.start_time, Show.id)[1]
+            cls.ids['second_show'] = encode_cursor(list(second))
+            db.session.remove()
+
+    def request(self, method, url, **kwargs):
+        """Issue one request from a fresh client and return (statements, response, client)."""
+        client = app.test_client()
+        endpoint = app.url_map.bind('localhost').match(url.split('?')[0], method=method.upper())[0]
+        with count_queries() as statements:
+            response = getattr(client, method)(url, **kwargs)
+            response.get_data()  # streamed bodies run their queries while being read
+        bound = QUERY_BOUNDS[endpoint]
+        self.assertLessEqual(len(statements), bound, '%s %s issued %d statements, over its bound of %d:\n%s' % (
+            method.upper(), url, len(statements), bound, '\n'.join(statements)))
+        return statements, response, client
+
+    def assertConstantQueries(self, method, few, many, **kwargs):
+        """Request ``few`` (covering one row) and ``many`` (covering a page of rows)."""
+        few_statements, few_response, _ = self.request(method, few, **kwargs)
+        many_statements, many_response, _ = self.request(method, many, **kwargs)
+        self.assertEqual(few_response.status_code, 200, few)
+        self.assertEqual(many_response.status_code, 200, many)
+        self.assertEqual(len(few_statements), len(many_statements),
+                         '%s issues more statements than %s; a query is running per row:\n%s' % (
+                             many, few, '\n'.join(many_statements)))
+        return few_response, many_response
+
+    def assertFlashed(self, client, message):
+        with client.session_transaction() as session:
+            flashes = [text for _, text in session.get('_flashes', [])]
+        self.assertTrue(any(message in text for text in flashes), flashes)
+
+    def test_every_route_has_a_bound(self):
+        endpoints = set(rule.endpoint for rule in app.url_map.iter_rules()) - {'static'}
+        self.assertEqual(endpoints, set(QUERY_BOUNDS))
+
+    #  Pages
+    #  ----------------------------------------------------------------
+
+    def test_index(self):
+        self.request('get', '/')
+
+    def test_venues(self):
+        few, many = self.assertConstantQueries('get', '/venues?city=Quiet', '/venues')
+        self.assertIn(b'Lone Venue', few.data)
+        self.assertIn(b'Busy Venue', many.data)
+        self.assertConstantQueries('get', '/venues?city=Quiet&genre=Jazz', '/venues?genre=Jazz&genre=Blues')
+
+    def test_venue_areas_in_one_query(self):
+        # every area on the page comes from the same single statement as its venues and
+        # their upcoming show counts: ten more areas cost nothing more than one
+        with app.app_context():
+            areas = [Venue(name='Area Venue %02d' % i, city='Area %02d' % i, state='AK', address='1 Main St',
+                           phone='555-555-5555', genres=['Jazz']) for i in range(10)]
+            db.session.add_all(areas)
+            db.session.commit()
+            area_ids = [venue.id for venue in areas]
+            db.session.remove()
+        try:
+            one, _, _ = self.request('get', '/venues?city=Quiet')
+            many, response, _ = self.request('get', '/venues')
+            self.assertEqual(len(one), 1, '\n'.join(one))
+            self.assertEqual(len(many), 1, '\n'.join(many))
+            for i in range(10):
+                self.assertIn(('Area %02d, AK' % i).encode(), response.data)
+        finally:
+            with app.app_context():
+                Venue.query.filter(Venue.id.in_(area_ids)).delete(synchronize_session=False)
+                db.session.commit()
+                db.session.remove()
+
+    def test_search_venues(self):
+        few_statements, _, _ = self.request('post', '/venues/search', data={'search_term': 'Lone'})
+        many_statements, response, _ = self.request('post', '/venues/search', data={'search_term': 'Busy'})
+        self.assertIn(b'Busy Venue 29', response.data)
+        self.assertEqual(len(few_statements), len(many_statements))
+
+    def test_show_venue(self):
+        self.assertConstantQueries('get', '/venues/%d' % self.ids['quiet_venue'],
+                                   '/venues/%d' % self.ids['busy_venue'])
+        _, response, _ = self.request('get', '/venues/999999')
+        self.assertEqual(response.status_code, 404)
+
+    def test_artists(self):
+        self.assertConstantQueries('get', '/artists?city=Quiet', '/artists')
+
+    def test_search_artists(self):
+        few_statements, _, _ = self.request('post', '/artists/search', data={'search_term': 'Lone'})
+        many_statements, response, _ = self.request('post', '/artists/search', data={'search_term': 'Busy'})
+        self.assertIn(b'Busy Artist 29', response.data)
+        self.assertEqual(len(few_statements), len(many_statements))
+
+    def test_show_artist(self):
+        self.assertConstantQueries('get', '/artists/%d' % self.ids['quiet_artist'],
+                                   '/artists/%d' % self.ids['busy_artist'])
+
+    def test_shows(self):
+        self.assertConstantQueries('get', '/shows?before=%s' % self.ids['second_show'], '/shows')
+
+    def test_shows_streamed(self):
+        # STREAM_SHOWS renders every show from one server-side cursor, while the body is read
+        app.config['STREAM_SHOWS'] = True
+        try:
+            statements, response, _ = self.request('get', '/shows')
+        finally:
+            app.config['STREAM_SHOWS'] = False
+        # a rendered page is sent with its length, a streamed one without
+        self.assertNotIn('Content-Length', response.headers)
+        self.assertEqual(len(statements), 1, '\n'.join(statements))
+        with app.app_context():
+            count = Show.query.count()
+            db.session.remove()
+        self.assertEqual(response.get_data().count(b'tile-show'), count)
+        self.assertIn(b'Busy Artist 29', response.data)
+
+    def test_forms(self):
+        for url in ('/venues/create', '/artists/create', '/shows/create',
+                    '/venues/%d/edit' % self.ids['busy_venue'], '/artists/%d/edit' % self.ids['busy_artist']):
+            _, response, _ = self.request('get', url)
+            self.assertEqual(response.status_code, 200, url)
+
+    #  Writes
+    #  ----------------------------------------------------------------
+
+    def test_create_venue(self):
+        _, response, _ = self.request('post', '/venues/create', data=VENUE_FORM)
+        self.assertIn(b'successfully listed', response.data)
+
+    def test_create_artist(self):
+        _, response, _ = self.request('post', '/artists/create', data=ARTIST_FORM)
+        self.assertIn(b'successfully listed', response.data)
+
+    def test_create_show(self):
+        _, response, _ = self.request('post', '/shows/create', data={
+            'venue_id': self.ids['busy_venue'], 'artist_id': self.ids['busy_artist'],
+            'start_time': (datetime.now() + timedelta(days=90)).strftime('%Y-%m-%d %H:%M:%S')})
+        self.assertIn(b'successfully listed', response.data)
+
+    def test_edit_venue(self):
+        # each venue keeps its name and city, which the listing tests look for
+        counts = []
+        for venue_id, name, city in ((self.ids['quiet_venue'], 'Lone Venue', 'Quiet'),
+                                     (self.ids['busy_venue'], 'Busy Venue 00', 'Busy')):
+            statements, _, client = self.request('post', '/venues/%d/edit' % venue_id,
+                                                 data=dict(VENUE_FORM, name=name, city=city))
+            self.assertFlashed(client, 'successfully updated')
+            counts.append(len(statements))
+        self.assertEqual(counts[0], counts[1])
+
+    def test_edit_artist(self):
+        counts = []
+        for artist_id, name, city in ((self.ids['quiet_artist'], 'Lone Artist', 'Quiet'),
+                                      (self.ids['busy_artist'], 'Busy Artist 00', 'Busy')):
+            statements, _, client = self.request('post', '/artists/%d/edit' % artist_id,
+                                                 data=dict(ARTIST_FORM, name=name, city=city))
+            self.assertFlashed(client, 'successfully updated')
+            counts.append(len(statements))
+        self.assertEqual(counts[0], counts[1])
+
+    def test_delete_venue(self):
+        counts = []
+        for venue_id in (self.ids['doomed_small'], self.ids['doomed_big']):
+            statements, _, client = self.request('delete', '/venues/%d' % venue_id)
+            self.assertFlashed(client, 'successfully deleted')
+            counts.append(len(statements))
+        self.assertEqual(counts[0], counts[1])
+
+    #  JSON API, metrics and export
+    #  ----------------------------------------------------------------
+
+    def test_api_listings(self):
+        self.assertConstantQueries('get', '/api/venues?city=Quiet', '/api/venues')
+        self.assertConstantQueries('get', '/api/artists?city=Quiet', '/api/artists')
+        self.assertConstantQueries('get', '/api/shows?before=%s' % self.ids['second_show'], '/api/shows')
+
+    def test_api_details(self):
+        self.assertConstantQueries('get', '/api/venues/%d' % self.ids['quiet_venue'],
+                                   '/api/venues/%d' % self.ids['busy_venue'])
+        self.assertConstantQueries('get', '/api/artists/%d' % self.ids['quiet_artist'],
+                                   '/api/artists/%d' % self.ids['busy_artist'])
+        # each ?fields= selection is its own representation, with its own ETag
+        url = '/api/venues/%d' % self.ids['quiet_venue']
+        _, name, _ = self.request('get', url + '?fields=name')
+        _, shows, _ = self.request('get', url + '?fields=name,upcoming_shows',
+                                   headers={'If-None-Match': name.headers['ETag']})
+        self.assertEqual(shows.status_code, 200)
+        self.assertIn('upcoming_shows', shows.json)
+        _, again, _ = self.request('get', url + '?fields=name,,name', headers={'If-None-Match': name.headers['ETag']})
+        self.assertEqual(again.status_code, 304)
+        _, response, _ = self.request('get', '/api/shows/%d?fields=start_time,venue_name,artist_name'
+                                      % self.ids['quiet_show'])
+        self.assertEqual(set(response.json), {'start_time', 'venue_name', 'artist_name'})
+        self.assertEqual(response.json['venue_name'], 'Lone Venue')
+        _, response, _ = self.request('get', '/api/shows/999999')
+        self.assertEqual(response.status_code, 404)
+
+    def test_metrics(self):
+        self.request('get', '/metrics')
+
+    def test_export(self):
+        for kind in ('venues', 'artists', 'shows'):
+            _, response, _ = self.request('get', '/export/%s.csv' % kind)
+            self.assertEqual(response.status_code, 200)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,166 @@
+"""Replica routing tests, against a primary and a streaming replica of it.
+
+Read-only views must read the replica while it keeps up, and the primary when it lags,
+when it is detached from the primary, and for a client that just wrote; pages read from
+the replica must not be stored in the response cache.
+
+The tests need two local PostgreSQL servers: an empty database on the primary they are
+free to drop and recreate, and a streaming replica of it (e.g. made with
+``pg_basebackup -R``).  They pause the replica's replay and change its primary_conninfo,
+so connect to both as a superuser:
+
+    FYYUR_TEST_DATABASE_URL=postgresql://localhost:5432/fyyur_test \\
+    FYYUR_TEST_REPLICA_URL=postgresql://localhost:5433/fyyur_test python test_replicas.py -v
+"""
+import os
+import time
+import unittest
+from contextlib import contextmanager
+
+from flask import g
+from sqlalchemy import event, text
+
+from app import create_app, replica_router
+from cache import LRUCache
+from models import db, Venue
+from routing import PRIMARY_LSN_QUERY
+
+TEST_DATABASE_URL = os.environ.get('FYYUR_TEST_DATABASE_URL')
+TEST_REPLICA_URL = os.environ.get('FYYUR_TEST_REPLICA_URL')
+MAX_LAG = 1
+
+VENUE_FORM = {'name': 'Edited Venue', 'city': 'Elsewhere', 'state': 'NY', 'address': '1 Main St',
+              'phone': '555-555-5555', 'genres': ['Jazz'], 'facebook_link': 'http://facebook.com/venue'}
+
+
+def _app(**config):
+    # lag is probed on every request; a second of it is tolerated, so WAL the primary
+    # writes in the background does not move reads off a replica that keeps up
+    return create_app(dict(
+        TESTING=True, WTF_CSRF_ENABLED=False, CACHE_TYPE='null', SQLALCHEMY_DATABASE_URI=TEST_DATABASE_URL,
+        SQLALCHEMY_BINDS={'replica_0': TEST_REPLICA_URL}, REPLICA_MAX_LAG=MAX_LAG, REPLICA_LAG_CHECK_INTERVAL=0,
+        READ_YOUR_WRITES_SECONDS=60, **config))
+
+
+@contextmanager
+def replica_reads(app):
+    """The statements views issue on the replica, lag probes left out."""
+    statements = []
+
+    def record(connection, cursor, statement, parameters, context, executemany):
+        if 'pg_is_in_recovery()' not in statement:
+            statements.append(statement)
+
+    engine = db.engines['replica_0']
+    event.listen(engine, 'before_cursor_execute', record)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, 'before_cursor_execute', record)
+
+
+def _wait(condition, timeout=10):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError('timed out waiting for the replica')
+        time.sleep(0.05)
+
+
+@unittest.skipUnless(TEST_DATABASE_URL and TEST_REPLICA_URL,
+                     'set FYYUR_TEST_DATABASE_URL and FYYUR_TEST_REPLICA_URL')
+class ReplicaRoutingTest(unittest.TestCase):
+
+    def setUp(self):
+        self.app = _app()
+        self.context = self.app.app_context()
+        self.context.push()
+        for table in db.metadata.tables.values():
+            for index in list(table.indexes):
+                if index.name.endswith('_trgm'):
+                    table.indexes.discard(index)
+        db.drop_all()
+        db.create_all()
+        venue = Venue(name='Venue', city='Quiet', state='NY', address='1 Main St', phone='555-555-5555',
+                      genres=['Jazz'])
+        db.session.add(venue)
+        db.session.commit()
+        g.pop('db_wrote', None)
+        self.venue_id = venue.id
+        self.caught_up()
+        self.client = self.app.test_client()
+
+    def tearDown(self):
+        self.replica(text('SELECT pg_wal_replay_resume()'))
+        db.session.remove()
+        self.context.pop()
+
+    def replica(self, statement, **parameters):
+        # autocommit, for ALTER SYSTEM
+        with db.engines['replica_0'].connect().execution_options(isolation_level='AUTOCOMMIT') as connection:
+            result = connection.execute(statement, parameters)
+            return result.scalar() if result.returns_rows else None
+
+    def caught_up(self):
+        with db.engine.connect() as connection:
+            lsn = connection.execute(PRIMARY_LSN_QUERY).scalar()
+        _wait(lambda: self.replica(text('SELECT pg_last_wal_replay_lsn() >= CAST(:lsn AS pg_lsn)'), lsn=lsn))
+
+    def write_on_primary(self, name):
+        db.session.get(Venue, self.venue_id).name = name
+        db.session.commit()
+        # the test client's requests share this app context: the write is not theirs
+        g.pop('db_wrote', None)
+
+    def test_reads_replica_when_caught_up(self):
+        with replica_reads(self.app) as statements:
+            response = self.client.get('/api/venues/%d?fields=name' % self.venue_id)
+        self.assertEqual(response.json, {'name': 'Venue'})
+        self.assertTrue(statements)
+
+    def test_skips_lagging_replica(self):
+        self.replica(text('SELECT pg_wal_replay_pause()'))
+        self.write_on_primary('Renamed')
+        time.sleep(MAX_LAG + 0.5)
+        with replica_reads(self.app) as statements:
+            response = self.client.get('/api/venues/%d?fields=name' % self.venue_id)
+        self.assertEqual(response.json, {'name': 'Renamed'})
+        self.assertEqual(statements, [])
+
+    def test_skips_detached_replica(self):
+        # without a primary_conninfo the replica's WAL receiver stops, while whatever it had
+        # received is replayed: the replay position alone would look up to date
+        conninfo = self.replica(text('SHOW primary_conninfo'))
+        self.replica(text("ALTER SYSTEM SET primary_conninfo = ''"))
+        try:
+            self.replica(text('SELECT pg_reload_conf()'))
+            _wait(lambda: not self.replica(text('SELECT count(*) FROM pg_stat_wal_receiver')))
+            with self.app.test_request_context():
+                self.assertIsNone(replica_router.lag('replica_0'))
+            with replica_reads(self.app) as statements:
+                self.client.get('/api/venues/%d?fields=name' % self.venue_id)
+            self.assertEqual(statements, [])
+        finally:
+            # set back rather than reset: pg_basebackup -R keeps it in postgresql.auto.conf too
+            self.replica(text("ALTER SYSTEM SET primary_conninfo = '%s'" % conninfo.replace("'", "''")))
+            self.replica(text('SELECT pg_reload_conf()'))
+            _wait(lambda: self.replica(text('SELECT count(*) FROM pg_stat_wal_receiver')))
+
+    def test_client_reads_primary_after_writing(self):
+        response = self.client.post('/venues/%d/edit' % self.venue_id, data=VENUE_FORM)
+        self.assertEqual(response.status_code, 302)
+        with replica_reads(self.app) as statements:
+            response = self.client.get('/api/venues/%d?fields=name' % self.venue_id)
+        self.assertEqual(response.json, {'name': 'Edited Venue'})
+        self.assertEqual(statements, [])
+
+    def test_replica_pages_are_not_cached(self):
+        self.app.extensions['response_cache'] = LRUCache()
+        for _ in range(2):
+            with replica_reads(self.app) as statements:
+                self.client.get('/api/venues')
+            self.assertTrue(statements)
+
+
+if __name__ == '__main__':
+    unittest.main()